@@ -0,0 +1,147 @@
+import json
+import multiprocessing
+import platform
+from pathlib import Path
+from typing import Annotated
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks.corpus import make_corpus
+from benchmarks.stages import STAGES, run_stage
+from pgqueryguard.query_files.baseline import parse_regression
+
+BASELINE_FILE = Path(__file__).with_name("baseline.json")
+# Рост памяти меньше этого порога считается шумом аллокатора.
+RSS_FLOOR_MB = 16.0
+
+console = Console()
+app = typer.Typer()
+
+
+def compare(
+    current: dict[str, dict], baseline: dict[str, dict], max_regression: float
+) -> list[str]:
+    problems = []
+    for stage, cur in current.items():
+        base = baseline.get(stage)
+        if not base:
+            continue
+        if base["per_sec"] and cur["per_sec"] < base["per_sec"] * (1 - max_regression):
+            drop = (1 - cur["per_sec"] / base["per_sec"]) * 100
+            problems.append(f"{stage}: throughput -{drop:.1f}%")
+        cur_rss, base_rss = cur.get("rss_delta_mb"), base.get("rss_delta_mb")
+        if cur_rss is not None and base_rss is not None:
+            limit = max(base_rss * (1 + max_regression), base_rss + RSS_FLOOR_MB)
+            if cur_rss > limit:
+                problems.append(f"{stage}: memory {base_rss:.1f} -> {cur_rss:.1f} MB")
+    return problems
+
+
+def print_results(results: dict[str, dict], baseline: dict[str, dict]) -> None:
+    table = Table(title="pgqueryguard benchmarks")
+    table.add_column("Stage", no_wrap=True)
+    for col in ("Items", "Seconds", "Items/s", "Δ vs baseline"):
+        table.add_column(col, justify="right")
+    table.add_column("Peak RSS, MB", justify="right")
+    table.add_column("Stage RSS, MB", justify="right")
+    for stage, r in results.items():
+        base = baseline.get(stage)
+        delta = ""
+        if base and base["per_sec"]:
+            pct = (r["per_sec"] / base["per_sec"] - 1) * 100
+            color = "green" if pct >= 0 else "red"
+            delta = f"[{color}]{pct:+.1f}%[/{color}]"
+        table.add_row(
+            stage,
+            str(r["items"]),
+            f"{r['seconds']:.3f}",
+            f"{r['per_sec']:,.1f}",
+            delta,
+            "—" if r["peak_rss_mb"] is None else f"{r['peak_rss_mb']:.1f}",
+            "—" if r["rss_delta_mb"] is None else f"{r['rss_delta_mb']:.1f}",
+        )
+    console.print(table)
+
+
+@app.command()
+def main(
+    files: Annotated[int, typer.Option(help="Размер корпуса (1000 / 10000)")] = 1000,
+    stage: Annotated[
+        list[str] | None, typer.Option(help="Запустить только эти этапы")
+    ] = None,
+    repeat: Annotated[int, typer.Option(help="Лучшее время из N попыток")] = 1,
+    seed: Annotated[int, typer.Option()] = 42,
+    baseline: Annotated[Path, typer.Option()] = BASELINE_FILE,
+    save_baseline: Annotated[
+        bool, typer.Option("--save-baseline", help="Записать результат как baseline")
+    ] = False,
+    max_regression: Annotated[str, typer.Option()] = "20%",
+    output: Annotated[
+        Path | None, typer.Option(help="Сохранить результат в JSON")
+    ] = None,
+    dump: Annotated[
+        Path | None, typer.Option(help="Только выгрузить корпус в .sql файлы")
+    ] = None,
+):
+    if dump is not None:
+        make_corpus(files, seed).dump(dump)
+        console.print(f"=== Corpus: {files} files in {dump} ===")
+        return
+
+    stages = stage or list(STAGES)
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise typer.BadParameter(f"unknown stages: {', '.join(unknown)}")
+
+    # spawn: каждый этап в чистом процессе, иначе ru_maxrss общий на весь прогон.
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    with ctx.Pool(1, maxtasksperchild=1) as pool:
+        for name in stages:
+            results[name] = pool.apply(run_stage, (name, files, seed, repeat))
+
+    stored = {}
+    if baseline.exists():
+        stored = json.loads(baseline.read_text(encoding="utf-8"))
+    key = str(files)
+    base_stages = stored.get(key, {}).get("stages", {})
+    print_results(results, base_stages)
+
+    run = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": seed,
+        "stages": results,
+    }
+    if output is not None:
+        output.write_text(json.dumps(run, indent=2), encoding="utf-8")
+    if save_baseline:
+        stored[key] = {**stored.get(key, {}), **run}
+        stored[key]["stages"] = {**base_stages, **results}
+        baseline.write_text(json.dumps(stored, indent=2) + "\n", encoding="utf-8")
+        console.print(f"=== Baseline saved: {baseline} ===")
+        return
+
+    problems = compare(results, base_stages, parse_regression(max_regression))
+    for p in problems:
+        console.print(f"[red]✗[/red] {p}")
+    # Абсолютная пропускная способность между разными интерпретаторами и
+    # машинами несравнима: такой прогон только показывает разницу.
+    recorded = {k: stored.get(key, {}).get(k) for k in ("python", "machine")}
+    current = {k: run[k] for k in ("python", "machine")}
+    if base_stages and recorded != current:
+        console.print(
+            f"[yellow]Baseline recorded on Python {recorded['python']} / "
+            f"{recorded['machine']}, this run is Python {current['python']} / "
+            f"{current['machine']}: not gating. Run --save-baseline on this "
+            "environment to compare.[/yellow]"
+        )
+        return
+    if problems:
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
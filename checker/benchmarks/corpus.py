@@ -0,0 +1,173 @@
+import random
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import sqlparse
+
+TABLES = {
+    "customer": ["customer_id", "store_id", "first_name", "last_name", "email"],
+    "rental": ["rental_id", "rental_date", "customer_id", "inventory_id", "staff_id"],
+    "payment": ["payment_id", "customer_id", "rental_id", "amount", "payment_date"],
+    "inventory": ["inventory_id", "film_id", "store_id", "last_update"],
+    "film": ["film_id", "title", "release_year", "length", "rating"],
+    "store": ["store_id", "manager_staff_id", "address_id"],
+}
+SCHEMA = {t: {c: "INT" for c in cols} for t, cols in TABLES.items()}
+
+JOINS = [
+    ("customer", "rental", "customer_id"),
+    ("customer", "payment", "customer_id"),
+    ("rental", "payment", "rental_id"),
+    ("rental", "inventory", "inventory_id"),
+    ("inventory", "film", "film_id"),
+    ("store", "customer", "store_id"),
+]
+
+
+# Доли "тяжёлых" объектов в корпусе.
+HUGE_SQL_SHARE = 0.05
+DEEP_PLAN_SHARE = 0.1
+WIDE_PLAN_SHARE = 0.05
+
+
+@dataclass
+class Corpus:
+    """Синтетический корпус: тексты файлов и по одному плану на файл."""
+
+    files: list[str] = field(default_factory=list)
+    plans: list[dict[str, Any]] = field(default_factory=list)
+
+    def statements(self) -> list[str]:
+        return [
+            s.strip() for text in self.files for s in sqlparse.split(text) if s.strip()
+        ]
+
+    def dump(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        for i, text in enumerate(self.files):
+            (directory / f"q_{i:05d}.sql").write_text(text, encoding="utf-8")
+
+
+def _small_select(rnd: random.Random) -> str:
+    a, b, key = rnd.choice(JOINS)
+    cols = ", ".join(f"{a}.{c}" for c in rnd.sample(TABLES[a], 2))
+    return (
+        f"SELECT {cols}, count(*) AS cnt\n"
+        f"FROM {a}\n"
+        f"JOIN {b} ON {a}.{key} = {b}.{key}\n"
+        f"WHERE {a}.{TABLES[a][0]} > {rnd.randint(1, 10_000)}\n"
+        f"GROUP BY {cols}\n"
+        f"ORDER BY cnt DESC\n"
+        f"LIMIT {rnd.randint(10, 500)}"
+    )
+
+
+def _huge_select(rnd: random.Random) -> str:
+    ctes = ",\n".join(
+        f"c{i} AS (SELECT customer_id, sum(amount) AS s{i} FROM payment "
+        f"WHERE amount > {rnd.randint(1, 50)} GROUP BY customer_id)"
+        for i in range(rnd.randint(10, 30))
+    )
+    cols = ", ".join(
+        f"p.amount * {rnd.randint(1, 9)} AS a{i}" for i in range(rnd.randint(100, 300))
+    )
+    in_list = ", ".join(str(rnd.randint(1, 600_000)) for _ in range(2_000))
+    return (
+        f"WITH {ctes}\n"
+        f"SELECT {cols}\n"
+        f"FROM payment p JOIN c0 ON c0.customer_id = p.customer_id\n"
+        f"WHERE p.rental_id IN ({in_list})"
+    )
+
+
+def _sql_file(rnd: random.Random) -> str:
+    statements = []
+    for _ in range(rnd.randint(1, 3)):
+        if rnd.random() < HUGE_SQL_SHARE:
+            statements.append(_huge_select(rnd))
+        else:
+            statements.append(_small_select(rnd))
+    return ";\n".join(statements) + ";\n"
+
+
+def _scan(rnd: random.Random) -> dict[str, Any]:
+    rel = rnd.choice(list(TABLES))
+    rows = rnd.randint(1, 2_000_000)
+    node: dict[str, Any] = {
+        "Node Type": rnd.choice(["Seq Scan", "Index Scan", "Bitmap Heap Scan"]),
+        "Relation Name": rel,
+        "Alias": rel[0],
+        "Startup Cost": 0.0,
+        "Total Cost": rows * 0.02,
+        "Plan Rows": rows,
+        "Plan Width": rnd.randint(4, 200),
+    }
+    if node["Node Type"] == "Seq Scan" and rnd.random() < 0.5:
+        node["Filter"] = f"({rel[0]}.{TABLES[rel][-1]} > {rnd.randint(1, 1000)})"
+    return node
+
+
+def _join(rnd: random.Random, outer, inner) -> dict[str, Any]:
+    kind = rnd.choice(["Hash Join", "Nested Loop", "Merge Join"])
+    if kind == "Hash Join":
+        inner = {
+            "Node Type": "Hash",
+            "Total Cost": inner["Total Cost"],
+            "Plan Rows": inner["Plan Rows"],
+            "Plan Width": inner["Plan Width"],
+            "Plans": [inner],
+        }
+    rows = max(outer["Plan Rows"], inner["Plan Rows"])
+    node: dict[str, Any] = {
+        "Node Type": kind,
+        "Join Type": "Inner",
+        "Startup Cost": 0.0,
+        "Total Cost": outer["Total Cost"] + inner["Total Cost"] + rows * 0.01,
+        "Plan Rows": rows,
+        "Plan Width": outer["Plan Width"] + inner["Plan Width"],
+        "Plans": [outer, inner],
+    }
+    if kind == "Hash Join":
+        node["Hash Cond"] = "(a.customer_id = b.customer_id)"
+    return node
+
+
+def _plan(rnd: random.Random) -> dict[str, Any]:
+    r = rnd.random()
+    if r < WIDE_PLAN_SHARE:
+        kids = [_scan(rnd) for _ in range(rnd.randint(100, 400))]
+        root = {
+            "Node Type": "Append",
+            "Total Cost": sum(k["Total Cost"] for k in kids),
+            "Plan Rows": sum(k["Plan Rows"] for k in kids),
+            "Plan Width": 64,
+            "Plans": kids,
+        }
+    else:
+        depth = rnd.randint(30, 80) if r < WIDE_PLAN_SHARE + DEEP_PLAN_SHARE else 3
+        root = _scan(rnd)
+        for _ in range(depth):
+            root = _join(rnd, root, _scan(rnd))
+    sort = {
+        "Node Type": "Sort",
+        "Sort Key": ["cnt DESC"],
+        "Total Cost": root["Total Cost"] * 1.1,
+        "Plan Rows": root["Plan Rows"],
+        "Plan Width": root["Plan Width"],
+        "Plans": [root],
+    }
+    return {"Plan": sort}
+
+
+def make_corpus(files: int, seed: int = 42) -> Corpus:
+    rnd = random.Random(seed)
+    corpus = Corpus()
+    for _ in range(files):
+        corpus.files.append(_sql_file(rnd))
+        corpus.plans.append(_plan(rnd))
+    return corpus
+
+
+def table_stats() -> dict[str, dict[str, Any]]:
+    return {t: {"relpages": 50_000, "reltuples": 5_000_000.0} for t in TABLES}
@@ -0,0 +1,178 @@
+import os
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+import sqlparse
+
+from benchmarks.corpus import SCHEMA, Corpus, make_corpus, table_stats
+from pgqueryguard.checkers.formatters import format_with_sqlglot
+from pgqueryguard.checkers.optimizer import optimize_query
+from pgqueryguard.checkers.validator import validate_query
+from pgqueryguard.outer_database.advice import advise_from_plan
+from pgqueryguard.outer_database.count_resourses import estimate_profile
+from pgqueryguard.query_files.report import write_html_report, write_report_assets
+from pgqueryguard.query_files.report_index import IndexItem, write_index_page
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+@dataclass
+class StageResult:
+    stage: str
+    items: int
+    seconds: float
+    per_sec: float
+    peak_rss_mb: float | None
+    rss_delta_mb: float | None
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты.
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _statements(corpus: Corpus, _: Path) -> list[str]:
+    return corpus.statements()
+
+
+def _profiles(corpus: Corpus, _: Path) -> list[tuple[dict, Any]]:
+    return [(p, estimate_profile(p)) for p in corpus.plans]
+
+
+def _reports(corpus: Corpus, workdir: Path) -> list[tuple[dict, Any, list]]:
+    stats = table_stats()
+    return [
+        (p, prof, advise_from_plan(p, stats)) for p, prof in _profiles(corpus, workdir)
+    ]
+
+
+def _items(corpus: Corpus, workdir: Path) -> list[IndexItem]:
+    items = []
+    for i, (prof, sql) in enumerate(
+        zip((estimate_profile(p) for p in corpus.plans), corpus.files, strict=True)
+    ):
+        items.append(
+            IndexItem(
+                title=f"q_{i:05d}.sql",
+                file=f"q_{i:05d}.sql",
+                report_rel=f"reports/{i}.html",
+                risk="LOW",
+                total_cost=prof.total_cost,
+                est_pages=prof.est_pages,
+                est_bytes=prof.est_bytes,
+                est_memory_bytes=prof.est_memory_bytes,
+                warnings=len(prof.warnings),
+                excerpt=sql.replace("\n", " ")[:180],
+                tables=sorted({c.relation for c in prof.node_costs if c.relation}),
+                plan_nodes=sorted({c.label for c in prof.node_costs}),
+            )
+        )
+    return items
+
+
+def _run_split(files: list[str], _: Path) -> int:
+    return sum(1 for text in files for s in sqlparse.split(text) if s.strip())
+
+
+def _run_validate(statements: list[str], _: Path) -> int:
+    for s in statements:
+        validate_query(s)
+    return len(statements)
+
+
+def _run_optimize(statements: list[str], _: Path) -> int:
+    for s in statements:
+        optimize_query(s, SCHEMA)
+    return len(statements)
+
+
+def _run_format(statements: list[str], _: Path) -> int:
+    for s in statements:
+        format_with_sqlglot(s, {})
+    return len(statements)
+
+
+def _run_profile(plans: list[dict], _: Path) -> int:
+    for p in plans:
+        estimate_profile(p)
+    return len(plans)
+
+
+def _run_advise(profiles: list[tuple[dict, Any]], _: Path) -> int:
+    stats = table_stats()
+    for plan, _prof in profiles:
+        advise_from_plan(plan, stats)
+    return len(profiles)
+
+
+def _run_html(reports: list[tuple[dict, Any, list]], workdir: Path) -> int:
+    assets = write_report_assets(str(workdir))
+    for i, (plan, prof, adv) in enumerate(reports):
+        path = os.path.join(workdir, f"{i}.html")
+        write_html_report(path, plan, prof, adv, assets_dir=assets)
+    return len(reports)
+
+
+def _run_index(items: list[IndexItem], workdir: Path) -> int:
+    write_index_page(str(workdir), items)
+    return len(items)
+
+
+Prepare = Callable[[Corpus, Path], Any]
+Run = Callable[[Any, Path], int]
+
+# Этап -> (подготовка входных данных, измеряемая функция).
+STAGES: dict[str, tuple[Prepare, Run]] = {
+    "split": (lambda c, _: c.files, _run_split),
+    "validate_query": (_statements, _run_validate),
+    "optimize_query": (_statements, _run_optimize),
+    "format_with_sqlglot": (_statements, _run_format),
+    "estimate_profile": (lambda c, _: c.plans, _run_profile),
+    "advise_from_plan": (_profiles, _run_advise),
+    "write_html_report": (_reports, _run_html),
+    "write_index_page": (_items, _run_index),
+}
+
+
+def run_stage(stage: str, files: int, seed: int, repeat: int) -> dict[str, Any]:
+    """
+    Выполняется в отдельном процессе: так пиковый RSS относится к одному
+    этапу, а не копится за весь прогон. Время — лучшее из repeat попыток.
+    """
+    prepare, run = STAGES[stage]
+    corpus = make_corpus(files, seed)
+    with tempfile.TemporaryDirectory(prefix="pgqg-bench-") as tmp:
+        workdir = Path(tmp)
+        inputs = prepare(corpus, workdir)
+        rss_before = peak_rss_mb()
+        best = float("inf")
+        items = 0
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            items = run(inputs, workdir)
+            best = min(best, time.perf_counter() - t0)
+        rss_after = peak_rss_mb()
+    delta = None
+    if rss_before is not None and rss_after is not None:
+        delta = rss_after - rss_before
+    return asdict(
+        StageResult(
+            stage=stage,
+            items=items,
+            seconds=best,
+            per_sec=items / best if best > 0 else 0.0,
+            peak_rss_mb=rss_after,
+            rss_delta_mb=delta,
+        )
+    )
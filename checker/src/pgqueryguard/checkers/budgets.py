@@ -0,0 +1,125 @@
+import re
+from dataclasses import dataclass, field
+
+import sqlglot
+
+from pgqueryguard.outer_database.count_resourses import CostProfile
+
+BUDGET_PREFIX = "pgqueryguard:"
+_FORBID_RE = re.compile(r"^([A-Za-z ]+?)\s*(?:\((.+)\))?$")
+# key=value; значение может содержать пробелы ("Seq Scan", "256 MB") и
+# запятые в скобках — заканчивается там, где начинается следующий key=.
+_PAIR_RE = re.compile(r"(\w+)=((?:\([^)]*\)|[^\s(]|\s+(?![^\s=(]*=))+)")
+# Запятая вне скобок: forbid=SeqScan(a, b),NestedLoop — два правила.
+_LIST_SEP_RE = re.compile(r",(?![^()]*\))")
+_SIZE_RE = re.compile(r"^(\d+(?:\.\d+)?)\s*(B|KB|MB|GB|TB)?$", re.IGNORECASE)
+_SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3, "TB": 1024**4}
+
+
+class BudgetError(ValueError):
+    pass
+
+
+@dataclass
+class Budget:
+    max_cost: float | None = None
+    max_memory: float | None = None
+    max_pages: float | None = None
+    max_rows: float | None = None
+    forbid: list[tuple[str, str | None]] = field(default_factory=list)
+
+
+def _parse_size(value: str) -> float:
+    m = _SIZE_RE.match(value.strip())
+    if not m:
+        raise BudgetError(f"Bad size in budget: {value!r}")
+    return float(m.group(1)) * _SIZE_UNITS[(m.group(2) or "B").upper()]
+
+
+def _norm_node(name: str) -> str:
+    return name.replace(" ", "").lower()
+
+
+def _parse_number(key: str, value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        raise BudgetError(f"Bad number for {key} in budget: {value!r}") from None
+
+
+def _apply(budget: Budget, key: str, value: str) -> None:
+    match key:
+        case "max_cost":
+            budget.max_cost = _parse_number(key, value)
+        case "max_pages":
+            budget.max_pages = _parse_number(key, value)
+        case "max_rows":
+            budget.max_rows = _parse_number(key, value)
+        case "max_memory":
+            budget.max_memory = _parse_size(value)
+        case "forbid":
+            for item in _LIST_SEP_RE.split(value):
+                m = _FORBID_RE.match(item.strip())
+                if not m:
+                    raise BudgetError(f"Bad forbid rule in budget: {item!r}")
+                node = _norm_node(m.group(1))
+                if m.group(2) is None:
+                    budget.forbid.append((node, None))
+                    continue
+                for rel in m.group(2).split(","):
+                    budget.forbid.append((node, rel.strip()))
+        case _:
+            raise BudgetError(f"Unknown budget key: {key!r}")
+
+
+def _check_gap(gap: str) -> None:
+    # Между парами допустимы только пробелы.
+    if gap.strip():
+        raise BudgetError(f"Expected key=value in budget: {gap.strip()!r}")
+
+
+def parse_budget(sql: str) -> Budget | None:
+    """
+    Бюджет запроса из комментариев вида
+    `-- pgqueryguard: max_cost=5000 max_memory=256MB forbid=Seq Scan(orders, items)`.
+    Комментарии берутся из AST sqlglot, поэтому переживают форматирование.
+    """
+    try:
+        tree = sqlglot.parse_one(sql, read="postgres")
+    except sqlglot.ParseError:
+        return None
+    budget: Budget | None = None
+    for node in tree.walk():
+        for comment in node.comments or []:
+            text = comment.strip()
+            if not text.lower().startswith(BUDGET_PREFIX):
+                continue
+            budget = budget or Budget()
+            body = text[len(BUDGET_PREFIX) :]
+            pos = 0
+            for m in _PAIR_RE.finditer(body):
+                _check_gap(body[pos : m.start()])
+                _apply(budget, m.group(1).lower(), m.group(2).strip())
+                pos = m.end()
+            _check_gap(body[pos:])
+    return budget
+
+
+def check_budget(budget: Budget, profile: CostProfile) -> list[str]:
+    violations: list[str] = []
+    limits = (
+        ("max_cost", budget.max_cost, profile.total_cost),
+        ("max_memory", budget.max_memory, profile.est_memory_bytes),
+        ("max_pages", budget.max_pages, profile.est_pages),
+        ("max_rows", budget.max_rows, profile.est_rows),
+    )
+    for name, limit, actual in limits:
+        if limit is not None and actual > limit:
+            violations.append(f"{name}={limit:,.0f} exceeded: estimated {actual:,.0f}")
+    for node_type, relation in budget.forbid:
+        for c in profile.node_costs:
+            if _norm_node(c.node_type) != node_type:
+                continue
+            if relation is None or relation == c.relation:
+                violations.append(f"forbidden plan node: {c.label}")
+    return violations
@@ -0,0 +1,28 @@
+import hashlib
+import re
+
+import sqlglot
+from sqlglot import exp
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str, keep_literals: bool = False) -> str:
+    """
+    Каноничный текст запроса: sqlglot-AST без комментариев и форматирования.
+    Без keep_literals константы заменяются плейсхолдером, как в pg_stat_statements.
+    """
+    try:
+        tree = sqlglot.parse_one(sql, read="postgres")
+    except sqlglot.ParseError:
+        return _WS_RE.sub(" ", sql).strip().rstrip(";").lower()
+    if not keep_literals:
+        tree = tree.transform(
+            lambda node: exp.Placeholder() if isinstance(node, exp.Literal) else node
+        )
+    return tree.sql(dialect="postgres", comments=False, normalize=True)
+
+
+def fingerprint(sql: str, keep_literals: bool = False) -> str:
+    canon = normalize_sql(sql, keep_literals)
+    return hashlib.sha1(canon.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,102 @@
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+from sqlglot.optimizer.scope import Scope, traverse_scope
+
+# Есть у любой таблицы, но не попадают в pg_attribute с attnum > 0.
+_SYSTEM_COLUMNS = {"ctid", "xmin", "xmax", "cmin", "cmax", "tableoid", "oid"}
+_SYSTEM_SCHEMAS = {"pg_catalog", "information_schema"}
+
+
+def _ident(node: exp.Expression | None) -> str:
+    # Postgres приводит имена без кавычек к нижнему регистру.
+    if not isinstance(node, exp.Identifier):
+        return ""
+    return node.name if node.quoted else node.name.lower()
+
+
+def table_name(table: exp.Table) -> str:
+    """schema.table или table; пусто у табличных функций (generate_series и т.п.)."""
+    name = _ident(table.this)
+    if not name:
+        return ""
+    db = _ident(table.args.get("db"))
+    return f"{db}.{name}" if db else name
+
+
+def _is_catalog(name: str) -> bool:
+    schema, _, rel = name.rpartition(".")
+    return schema in _SYSTEM_SCHEMAS or (not schema and rel.startswith("pg_"))
+
+
+def _scopes(sql: str) -> list[Scope] | None:
+    try:
+        return traverse_scope(sqlglot.parse_one(sql, read="postgres"))
+    except SqlglotError:
+        return None
+
+
+def referenced_tables(sql: str) -> set[str]:
+    """Реальные таблицы запроса: без CTE, подзапросов и табличных функций."""
+    return {
+        name
+        for scope in _scopes(sql) or []
+        for src in scope.sources.values()
+        if isinstance(src, exp.Table) and (name := table_name(src))
+    }
+
+
+def _resolve(scope: Scope | None, alias: str):
+    while scope is not None:
+        if alias in scope.sources:
+            return scope.sources[alias]
+        scope = scope.parent
+    return None
+
+
+def unknown_references(sql: str, columns: dict[str, set[str]]) -> list[str]:
+    """
+    Таблицы и столбцы запроса, которых нет в снимке схемы columns
+    (см. inspect.read_columns). Проверка осторожная: неквалифицированный
+    столбец проверяется, только если все источники запроса — таблицы из
+    снимка; столбцы CTE, подзапросов и функций не проверяются вовсе.
+    """
+    scopes = _scopes(sql)
+    if scopes is None:
+        return []
+    problems: set[str] = set()
+    known: set[str] = set()
+    names: set[str] = set()
+    derived = False
+    for scope in scopes:
+        for alias, src in scope.sources.items():
+            names.add(alias.lower())
+            name = table_name(src) if isinstance(src, exp.Table) else ""
+            if not name or _is_catalog(name):
+                derived = True
+            elif name not in columns:
+                problems.add(f"нет таблицы {name}")
+            else:
+                known |= columns[name]
+        # Явные псевдонимы: на них можно сослаться в ORDER BY/GROUP BY.
+        for sel in getattr(scope.expression, "selects", []):
+            if isinstance(sel, exp.Alias):
+                names.add(sel.alias.lower())
+
+    seen: set[int] = set()
+    for scope in scopes:
+        for col in scope.columns:
+            if id(col) in seen or isinstance(col.this, exp.Star):
+                continue
+            seen.add(id(col))
+            name = _ident(col.this)
+            if not name or name in _SYSTEM_COLUMNS:
+                continue
+            if col.table:
+                src = _resolve(scope, col.table)
+                table = table_name(src) if isinstance(src, exp.Table) else ""
+                if table in columns and name not in columns[table]:
+                    problems.add(f"нет столбца {table}.{name}")
+            elif not derived and name not in known and name not in names:
+                problems.add(f"нет столбца {name}")
+    return sorted(problems)
@@ -1,5 +1,10 @@
+import json
 import logging
 import os
+import time
+from collections.abc import AsyncIterator
+from contextlib import nullcontext
+from dataclasses import asdict
 from enum import StrEnum
 from pathlib import Path
 
@@ -7,6 +12,13 @@ import sqlparse
 import typer
 from sqlalchemy import create_engine
 
+from pgqueryguard.checkers.budgets import (
+    Budget,
+    BudgetError,
+    check_budget,
+    parse_budget,
+)
+from pgqueryguard.checkers.fingerprint import fingerprint
 from pgqueryguard.checkers.formatters import (
     format_with_pg_formatter,
     format_with_sqlglot,
@@ -14,29 +26,73 @@ from pgqueryguard.checkers.formatters import (
 from pgqueryguard.checkers.optimizer import optimize_query
 from pgqueryguard.checkers.validator import validate_query
 from pgqueryguard.outer_database.advice import advise_from_plan
-from pgqueryguard.outer_database.count_resourses import estimate_profile
+from pgqueryguard.outer_database.bench import BenchResult, run_benchmark
+from pgqueryguard.outer_database.count_resourses import (
+    CostProfile,
+    estimate_profile,
+    top_hotspots,
+)
 from pgqueryguard.outer_database.inspect import (
     get_column_types_from_sql,
+    read_memory_settings,
     read_table_stats,
     run_explain,
 )
+from pgqueryguard.query_files.baseline import (
+    compare_with_baseline,
+    load_baseline,
+    parse_regression,
+)
 from pgqueryguard.query_files.files import get_sql_files, read_file, write_file
-from pgqueryguard.query_files.report import write_html_report
+from pgqueryguard.query_files.plans import (
+    PlanWriter,
+    get_plan_files,
+    load_context,
+    load_plan_file,
+)
+from pgqueryguard.query_files.report import write_report_assets
 from pgqueryguard.query_files.report_index import IndexItem, write_index_page
+from pgqueryguard.query_files.results import (
+    RESULTS_FILE,
+    ResultsWriter,
+    iter_index_items,
+)
+from pgqueryguard.query_files.storage import ReportStore
 from pgqueryguard.utils.annotaions import (
+    BaselineOption,
+    BenchOptimizedOption,
+    BenchOutputOption,
+    BenchRunsOption,
+    BenchTimeoutOption,
+    BenchVariantOption,
+    BenchWarmupOption,
     DBUrlOption,
     FixOption,
     FormatConfigOption,
+    FromPlansOption,
+    GcOption,
+    MaxRegressionOption,
     PathArgument,
     PgFormatFileOption,
+    ProfileOption,
+    ProfileTraceOption,
     RecursiveOption,
+    ReportFormat,
+    ReportFormatOption,
+    SavePlansOption,
 )
 from pgqueryguard.utils.async_run import async_command
 from pgqueryguard.utils.parse_config import parse_opts_for_sqlglot
 from pgqueryguard.utils.pritty_prints import (
+    print_baseline_diff,
+    print_bench_results,
+    print_budget_violations,
+    print_plan_file_error,
+    print_profile,
     print_total_format_files,
     print_validation_errors,
 )
+from pgqueryguard.utils.profiling import Profiler
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s"
@@ -50,6 +106,113 @@ class FormatterParameter(StrEnum):
     PG_FORMAT = "pg_format"
 
 
+def _statements(sql: str) -> list[str]:
+    return [s.strip() for s in sqlparse.split(sql) if s.strip()]
+
+
+def _read_budget(query: str, file: Path) -> tuple[Budget | None, str | None]:
+    """Бюджет запроса и текст ошибки аннотации; ошибка не прерывает прогон."""
+    try:
+        return parse_budget(query), None
+    except BudgetError as exc:
+        print_budget_violations([str(exc)], file, query[:180])
+        return None, str(exc)
+
+
+def _budget_ok(budget: Budget, profile: CostProfile, query: str, file: Path) -> bool:
+    violations = check_budget(budget, profile)
+    if violations:
+        print_budget_violations(violations, file, query.replace("\n", " ")[:180])
+    return not violations
+
+
+def _stmt_label(file: Path, query: str) -> str:
+    return f"{file}: {' '.join(query.split())[:80]}"
+
+
+async def _explained(
+    files: list[Path],
+    engine,
+    errors: list[Path],
+    plans: PlanWriter | None,
+    prof: Profiler,
+) -> AsyncIterator[tuple[Path, str, dict, float]]:
+    for file in files:
+        with prof.stage("read", str(file)):
+            base_query = await read_file(file)
+        with prof.stage("validate", str(file)):
+            validation_errors = validate_query(base_query)
+        if validation_errors:
+            print_validation_errors(validation_errors, file)
+            errors.append(file)
+            continue
+        for query in _statements(base_query):
+            t0 = time.perf_counter()
+            with prof.stage("explain", _stmt_label(file, query)):
+                plan = run_explain(engine, query)
+            explain_ms = (time.perf_counter() - t0) * 1000
+            if plans:
+                with prof.stage("save_plan"):
+                    plans.write(file, query, plan)
+            yield file, query, plan, explain_ms
+
+
+async def _saved_plans(
+    files: list[Path], errors: list[Path], prof: Profiler
+) -> AsyncIterator[tuple[Path, str, dict, float]]:
+    for file in files:
+        t0 = time.perf_counter()
+        try:
+            with prof.stage("load_plan", str(file)):
+                saved = load_plan_file(file)
+        except ValueError as exc:
+            print_plan_file_error(file, str(exc))
+            errors.append(file)
+            continue
+        load_ms = (time.perf_counter() - t0) * 1000 / max(len(saved), 1)
+        for p in saved:
+            yield Path(p.file), p.sql, p.plan, load_ms
+
+
+def _finish_profile(prof: Profiler, trace_path: Path | None) -> None:
+    prof.stop()
+    if not prof.enabled:
+        return
+    print_profile(prof)
+    if trace_path is not None:
+        prof.write_chrome_trace(str(trace_path))
+        print(f"=== Trace: {trace_path} ===")
+
+
+def _index_item(
+    file: Path, rel_path: str, query: str, profile: CostProfile
+) -> IndexItem:
+    hot = top_hotspots(profile, 1)
+    return IndexItem(
+        title=Path(file).name,
+        file=str(Path(file)),
+        report_rel=rel_path,
+        risk=(
+            "HIGH"
+            if profile.est_pages >= 500_000 or profile.est_memory_bytes >= 1_000_000_000
+            else "MED"
+            if profile.est_pages >= 100_000 or profile.est_memory_bytes >= 256_000_000
+            else "LOW"
+        ),
+        total_cost=float(profile.total_cost),
+        est_pages=float(profile.est_pages),
+        est_bytes=float(profile.est_bytes),
+        est_memory_bytes=float(profile.est_memory_bytes),
+        warnings=len(profile.warnings or []),
+        excerpt=query.strip().replace("\n", " ")[:180],
+        top_hotspot=hot[0].label if hot else "",
+        # У планов без текста запроса (--from-plans) сопоставлять нечего.
+        fingerprint=fingerprint(query) if query else "",
+        tables=sorted({c.relation for c in profile.node_costs if c.relation}),
+        plan_nodes=sorted({c.label for c in profile.node_costs}),
+    )
+
+
 @app.command()
 @async_command
 async def check(
@@ -59,10 +222,19 @@ async def check(
     fix: FixOption = False,
     pg_format_file: PgFormatFileOption = None,
     config: FormatConfigOption = None,
+    profile: ProfileOption = False,
+    profile_trace: ProfileTraceOption = None,
 ):
+    prof = Profiler(enabled=profile or profile_trace is not None)
+    prof.start()
     files = get_sql_files(directory, recursive)
     error_files = 0
     formatted_files = 0
+    over_budget = 0
+
+    with prof.stage("catalog"):
+        engine = create_engine(str(db_url)) if db_url else None
+        mem_settings = read_memory_settings(engine) if engine else None
 
     opts = None
     if config:
@@ -72,29 +244,51 @@ async def check(
             opts = await parse_opts_for_sqlglot(config)
 
     for file in files:
-        base_query = await read_file(file)
+        label = str(file)
+        with prof.stage("read", label):
+            base_query = await read_file(file)
         query = base_query
-        errors = validate_query(query)
+        with prof.stage("validate", label):
+            errors = validate_query(query)
         if errors:
             print_validation_errors(errors, file)
             error_files += 1
             continue
-        if db_url:
-            engine = create_engine(str(db_url))
-            scheme = get_column_types_from_sql(engine, query)
-            query = optimize_query(query, scheme)
+        if engine:
+            for stmt in _statements(base_query):
+                budget, budget_error = _read_budget(stmt, file)
+                if budget_error:
+                    over_budget += 1
+                if budget is None:
+                    continue
+                with prof.stage("explain", _stmt_label(file, stmt)):
+                    plan = run_explain(engine, stmt)
+                with prof.stage("analyse", _stmt_label(file, stmt)):
+                    stmt_profile = estimate_profile(plan, settings=mem_settings)
+                if not _budget_ok(budget, stmt_profile, stmt, file):
+                    over_budget += 1
+            with prof.stage("catalog", label):
+                scheme = get_column_types_from_sql(engine, query)
+            with prof.stage("optimize", label):
+                query = optimize_query(query, scheme)
         if pg_format_file:
-            query = await format_with_pg_formatter(query, pg_format_file, opts or [])
+            with prof.stage("pg_format", label):
+                query = await format_with_pg_formatter(
+                    query, pg_format_file, opts or []
+                )
         else:
-            query = format_with_sqlglot(query, opts or {})
+            with prof.stage("format", label):
+                query = format_with_sqlglot(query, opts or {})
 
         if fix:
             if base_query != query:
-                await write_file(file, query)
+                with prof.stage("write", label):
+                    await write_file(file, query)
                 formatted_files += 1
 
     print_total_format_files(formatted_files, error_files)
-    if error_files:
+    _finish_profile(prof, profile_trace)
+    if error_files or over_budget:
         raise typer.Exit(code=1)
 
 
@@ -104,62 +298,152 @@ async def report(
     directory: PathArgument,
     db_url: DBUrlOption = None,
     recursive: RecursiveOption = True,
+    baseline: BaselineOption = None,
+    max_regression: MaxRegressionOption = "20%",
+    output_format: ReportFormatOption = ReportFormat.HTML,
+    gc: GcOption = False,
+    from_plans: FromPlansOption = False,
+    save_plans: SavePlansOption = False,
+    profile: ProfileOption = False,
+    profile_trace: ProfileTraceOption = None,
 ):
-    files = get_sql_files(directory, recursive)
-    error_files = 0
+    prof = Profiler(enabled=profile or profile_trace is not None)
+    prof.start()
+    # Загружаем до записи отчёта: baseline может указывать на прошлый manifest.json.
+    baseline_items = load_baseline(baseline) if baseline else None
+    error_files: list[Path] = []
+    over_budget = 0
     items_for_index = []
     output_dir = "pgqueryguard_reports"
-    reports_subdir = os.path.join(output_dir, "reports")
-    os.makedirs(reports_subdir, exist_ok=True)
+    store = ReportStore(output_dir, write_report_assets(output_dir))
+    results_path = os.path.join(output_dir, RESULTS_FILE)
+    stream = output_format == ReportFormat.JSONL
 
-    engine = create_engine(str(db_url))
+    if from_plans:
+        plans_root = directory if directory.is_dir() else directory.parent
+        table_stats, mem_settings = load_context(plans_root)
+        files = get_plan_files(directory, recursive)
+        source = _saved_plans(files, error_files, prof)
+    else:
+        with prof.stage("catalog"):
+            engine = create_engine(str(db_url))
+            table_stats = read_table_stats(engine)
+            mem_settings = read_memory_settings(engine)
+        plans = PlanWriter(output_dir) if save_plans else None
+        if plans:
+            plans.write_context(table_stats, mem_settings)
+        files = get_sql_files(directory, recursive)
+        source = _explained(files, engine, error_files, plans, prof)
 
-    for file in files:
-        base_query = await read_file(file)
-        errors = validate_query(base_query)
+    with ResultsWriter(results_path) if stream else nullcontext() as results:
+        async for file, query, plan, explain_ms in source:
+            label = _stmt_label(file, query)
+            t1 = time.perf_counter()
+            with prof.stage("analyse", label):
+                cost_profile = estimate_profile(plan, settings=mem_settings)
+                adv = advise_from_plan(plan, table_stats, mem_settings)
+            budget, budget_error = _read_budget(query, file)
+            if budget_error or (
+                budget and not _budget_ok(budget, cost_profile, query, file)
+            ):
+                over_budget += 1
+            t2 = time.perf_counter()
+            with prof.stage("render", label):
+                rel_path = store.put(plan, cost_profile, adv, query)
+            t3 = time.perf_counter()
+
+            item = _index_item(file, rel_path, query, cost_profile)
+            if budget_error:
+                item.risk = "ERROR"
+                item.error = f"Bad budget annotation: {budget_error}"
+            if results:
+                timings = {
+                    "explain": explain_ms,
+                    "analyse": (t2 - t1) * 1000,
+                    "render": (t3 - t2) * 1000,
+                }
+                results.write(item, cost_profile, adv, timings)
+            else:
+                items_for_index.append(item)
+
+    with prof.stage("index"):
+        if stream:
+            write_index_page(output_dir, iter_index_items(results_path))
+        else:
+            write_index_page(output_dir, items_for_index)
+    if stream:
+        print(f"=== Results: ./{output_dir}/{RESULTS_FILE} ===")
+    print("=== Report: ./pgqueryguard_reports/index.html ===")
+    print(f"=== Reports: {store.written} written, {store.reused} unchanged ===")
+    if gc:
+        with prof.stage("gc"):
+            removed = store.gc()
+        print(f"=== Removed {removed} orphaned reports ===")
+    _finish_profile(prof, profile_trace)
+
+    if baseline_items is not None:
+        threshold = parse_regression(max_regression)
+        current = iter_index_items(results_path) if stream else items_for_index
+        diff = compare_with_baseline(current, baseline_items, threshold)
+        print_baseline_diff(diff, threshold)
+        if diff.regressions:
+            raise typer.Exit(code=1)
+    if over_budget:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+@async_command
+async def bench(
+    file: PathArgument,
+    db_url: DBUrlOption = None,
+    runs: BenchRunsOption = 10,
+    warmup: BenchWarmupOption = 2,
+    timeout: BenchTimeoutOption = 5.0,
+    variant: BenchVariantOption = None,
+    optimized: BenchOptimizedOption = False,
+    output: BenchOutputOption = None,
+):
+    """
+    Реальная латентность вместо оценки планировщика: каждый запрос из FILE
+    (и варианты) выполняется в read-only транзакции с откатом.
+    """
+    if not db_url:
+        raise typer.BadParameter("bench needs a database", param_hint="--db-url")
+    statements: list[tuple[str, str]] = []
+    for path in [file, *(variant or [])]:
+        sql = await read_file(path)
+        errors = validate_query(sql)
         if errors:
-            print_validation_errors(errors, file)
-            error_files += 1
-            continue
+            print_validation_errors(errors, path)
+            raise typer.Exit(code=1)
+        stmts = _statements(sql)
+        for i, stmt in enumerate(stmts, 1):
+            label = path.name if len(stmts) == 1 else f"{path.name} #{i}"
+            statements.append((label, stmt))
+    if not statements:
+        raise typer.BadParameter("no SQL statements found", param_hint="FILE")
 
-        for i, query in enumerate(
-            s.strip() for s in sqlparse.split(base_query) if s.strip()
+    engine = create_engine(str(db_url))
+    if optimized:
+        base = statements[0][1]
+        rewritten = optimize_query(base, get_column_types_from_sql(engine, base))
+        if fingerprint(rewritten, keep_literals=True) != fingerprint(
+            base, keep_literals=True
         ):
-            basename = Path(file).name
-            out_html = os.path.join(reports_subdir, f"{basename}_{i}.html")
-            os.makedirs(os.path.dirname(out_html), exist_ok=True)
-            rel_path = os.path.relpath(out_html, output_dir).replace("\\", "/")
-
-            plan = run_explain(engine, query)
-            profile = estimate_profile(plan)
-            adv = advise_from_plan(plan, read_table_stats(engine))
-            write_html_report(out_html, plan, profile, adv, query)
-
-            sql_text_for_excerpt = query.strip().replace("\n", " ")
-            items_for_index.append(
-                IndexItem(
-                    title=Path(file).name,
-                    file=str(Path(file)),
-                    report_rel=rel_path,
-                    risk=(
-                        "HIGH"
-                        if getattr(profile, "est_pages", 0) >= 500_000
-                        or getattr(profile, "est_memory_bytes", 0) >= 1_000_000_000
-                        else "MED"
-                        if getattr(profile, "est_pages", 0) >= 100_000
-                        or getattr(profile, "est_memory_bytes", 0) >= 256_000_000
-                        else "LOW"
-                    ),
-                    total_cost=float(getattr(profile, "total_cost", 0.0)),
-                    est_pages=float(getattr(profile, "est_pages", 0.0)),
-                    est_bytes=float(getattr(profile, "est_bytes", 0.0)),
-                    warnings=len(getattr(profile, "warnings", []) or []),
-                    excerpt=sql_text_for_excerpt[:180],
-                )
-            )
+            statements.append(("optimized", rewritten))
 
-    write_index_page("pgqueryguard_reports", items_for_index)
-    print("=== Report: ./pgqueryguard_reports/index.html ===")
+    results: list[BenchResult] = [
+        run_benchmark(engine, stmt, runs, warmup, int(timeout * 1000), label)
+        for label, stmt in statements
+    ]
+    print_bench_results(results)
+    if output is not None:
+        data = [asdict(r) for r in results]
+        await write_file(output, json.dumps(data, ensure_ascii=False, indent=2))
+        print(f"=== Results: {output} ===")
+    if any(r.error or r.timeouts for r in results):
+        raise typer.Exit(code=1)
 
 
 def main():
@@ -2,6 +2,11 @@ import re
 from dataclasses import dataclass
 from typing import Any, Optional
 
+from pgqueryguard.outer_database.count_resourses import (
+    HASH_TUPLE_OVERHEAD,
+    MemorySettings,
+)
+
 
 @dataclass
 class Advice:
@@ -20,6 +25,11 @@ SINGLECOL_RE = re.compile(
 )
 LITERAL_RE = re.compile(r"'([^']*)'")
 
+JOIN_NODES = ("Nested Loop", "Hash Join", "Merge Join")
+NESTLOOP_OUTER_ROWS = 1_000
+JOIN_EXPLOSION_FACTOR = 10.0
+JOIN_EXPLOSION_MIN_ROWS = 100_000
+
 
 def _unquote(ident: str) -> str:
     ident = ident.strip()
@@ -117,11 +127,149 @@ def pick_index_type(
     return "btree", ddl_cols, None
 
 
+def _inner_scan(n: dict[str, Any]) -> dict[str, Any]:
+    # Спускаемся через Materialize/Memoize и т.п. к реальному скану.
+    while n.get("Plans") and len(n["Plans"]) == 1 and not n.get("Relation Name"):
+        n = n["Plans"][0]
+    return n
+
+
+def _join_cond(n: dict[str, Any]) -> str:
+    parts = [n.get(k) for k in ("Hash Cond", "Merge Cond", "Join Filter")]
+    return " AND ".join(str(x) for x in parts if x)
+
+
+def extract_cols_for_alias(cond: str, alias: str) -> list[str]:
+    cols = [
+        _unquote(m.group(2))
+        for m in COLREF_RE.finditer(cond or "")
+        if _unquote(m.group(1)) == alias
+    ]
+    return _uniq_keep_order(cols)
+
+
+def _unqualified_cols(filt: str) -> list[str]:
+    # В Filter скана свои колонки идут без алиаса, чужие — с алиасом.
+    return _uniq_keep_order(
+        _unquote(m.group(1)) for m in SINGLECOL_RE.finditer(filt or "")
+    )
+
+
+def _param_cond(inner: dict[str, Any]) -> str:
+    """
+    Условие параметризованной внутренней стороны Nested Loop: Index Cond /
+    Recheck Cond со ссылкой на колонку другой таблицы (внешней стороны).
+    """
+    alias = inner.get("Alias") or inner.get("Relation Name") or ""
+    for key in ("Index Cond", "Recheck Cond"):
+        cond = str(inner.get(key) or "")
+        if any(_unquote(m.group(1)) != alias for m in COLREF_RE.finditer(cond)):
+            return cond
+    return ""
+
+
+def _nested_loop_advice(n: dict[str, Any]) -> Optional[Advice]:
+    kids = n.get("Plans") or []
+    if len(kids) != 2:
+        return None
+    outer_rows = float(kids[0].get("Plan Rows", 0))
+    inner = _inner_scan(kids[1])
+    if outer_rows < NESTLOOP_OUTER_ROWS or inner.get("Node Type") != "Seq Scan":
+        return None
+    rel = inner.get("Relation Name")
+    if not rel:
+        return None
+    alias = inner.get("Alias") or rel
+    filt = str(inner.get("Filter") or "")
+    cond = " AND ".join(x for x in (_join_cond(n), filt) if x)
+    # Только колонки внутренней таблицы: индекс создаётся на ней.
+    cols = _uniq_keep_order(
+        extract_cols_for_alias(cond, alias) + _unqualified_cols(filt)
+    )
+    ddl_cols = ", ".join(f'"{c}"' for c in (cols[:3] or ["<column>"]))
+    return Advice(
+        "high",
+        f"{rel}: Nested Loop сканирует {rel} целиком на каждую из "
+        f"~{int(outer_rows)} строк внешней стороны — нужен индекс по условию "
+        f"соединения{f' {cond}' if cond else ''}.",
+        ddl=f'CREATE INDEX ON "{rel}" USING btree ({ddl_cols});',
+        est_speedup="10-1000x",
+        index_type="btree",
+    )
+
+
+def _join_explosion_advice(n: dict[str, Any]) -> Optional[Advice]:
+    kids = n.get("Plans") or []
+    if len(kids) != 2:
+        return None
+    rows = float(n.get("Plan Rows", 0))
+    outer_rows, inner_rows = (float(k.get("Plan Rows", 0)) for k in kids)
+    inputs = max(outer_rows, inner_rows)
+    cond = _join_cond(n)
+    if n.get("Node Type") == "Nested Loop":
+        param = _param_cond(_inner_scan(kids[1]))
+        if param:
+            # Внутренняя сторона параметризована: её Plan Rows — на одну строку
+            # внешней, всего она отдаёт outer × inner строк (обычный 1:N).
+            cond = " AND ".join(x for x in (cond, param) if x)
+            inputs = max(outer_rows, outer_rows * inner_rows)
+    if rows < JOIN_EXPLOSION_MIN_ROWS or rows < inputs * JOIN_EXPLOSION_FACTOR:
+        return None
+    rels = [_inner_scan(k).get("Relation Name") or "подзапрос" for k in kids]
+    if not cond:
+        if rows < outer_rows * inner_rows / JOIN_EXPLOSION_FACTOR:
+            # Строк заметно меньше произведения входов — это не декартово
+            # произведение, условие просто не видно в плане.
+            return None
+        msg = (
+            f"{n.get('Node Type')} {rels[0]} × {rels[1]} без условия соединения: "
+            f"декартово произведение ~{int(rows)} строк. Проверьте, не потерян ли "
+            "предикат JOIN ... ON."
+        )
+        priority = "high"
+    else:
+        msg = (
+            f"{n.get('Node Type')} {rels[0]} × {rels[1]} по {cond} даёт ~{int(rows)} "
+            f"строк при ~{int(inputs)} на входе — соединение не по ключу. Проверьте, "
+            "что в ON участвуют все колонки ключа, или агрегируйте до соединения."
+        )
+        priority = "medium"
+    return Advice(priority, msg)
+
+
+def _hash_spill_advice(n: dict[str, Any], settings: MemorySettings) -> Optional[Advice]:
+    kids = n.get("Plans") or []
+    build = next((k for k in kids if k.get("Node Type") == "Hash"), None)
+    if build is None:
+        return None
+    need = float(build.get("Plan Rows", 0)) * (
+        float(build.get("Plan Width", 0)) + HASH_TUPLE_OVERHEAD
+    )
+    limit = settings.hash_mem_bytes
+    if need <= limit:
+        return None
+    rel = _inner_scan(build).get("Relation Name") or "подзапрос"
+    mb = int(need / (1024 * 1024)) + 1
+    work_mem_mb = int(mb / settings.hash_mem_multiplier) + 1
+    return Advice(
+        "medium",
+        f"Hash Join: хэш-таблица по {rel} (~{mb} MB) не помещается в hash_mem "
+        f"({int(limit / (1024 * 1024))} MB) и будет разбита на батчи на диске. "
+        "Отфильтруйте или сузьте строки build-стороны (SELECT только нужных "
+        "колонок) либо увеличьте work_mem для сессии.",
+        ddl=f"SET work_mem = '{work_mem_mb}MB';",
+        est_speedup="1.5-3x",
+    )
+
+
 def advise_from_plan(
-    plan_json: dict[str, Any], tables_stats: dict[str, dict[str, Any]]
+    plan_json: dict[str, Any],
+    tables_stats: dict[str, dict[str, Any]],
+    settings: MemorySettings | None = None,
 ) -> list[Advice]:
     adv: list[Advice] = []
     p = plan_json["Plan"]
+    settings = settings or MemorySettings()
 
     def walk(n: dict[str, Any], parent: dict[str, Any] | None = None):
         nt = n.get("Node Type", "")
@@ -168,8 +316,20 @@ def advise_from_plan(
                 )
             )
 
-        if nt == "Nested Loop" and join_type in (None, "Inner"):
-            pass
+        if nt == "Nested Loop" and join_type in (None, "Inner", "Left", "Semi", "Anti"):
+            nl = _nested_loop_advice(n)
+            if nl:
+                adv.append(nl)
+
+        if nt in JOIN_NODES:
+            boom = _join_explosion_advice(n)
+            if boom:
+                adv.append(boom)
+
+        if nt == "Hash Join":
+            spill = _hash_spill_advice(n, settings)
+            if spill:
+                adv.append(spill)
 
         for ch in n.get("Plans") or []:
             walk(ch, parent=n)
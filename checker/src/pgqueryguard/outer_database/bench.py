@@ -0,0 +1,100 @@
+import math
+import statistics
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import Engine, text
+from sqlalchemy.exc import DBAPIError
+
+# SQLSTATE query_canceled: сработал statement_timeout.
+_QUERY_CANCELED = "57014"
+
+
+@dataclass
+class BenchResult:
+    label: str
+    sql: str
+    runs: int = 0
+    timeouts: int = 0
+    error: str | None = None
+    samples_ms: list[float] = field(default_factory=list)
+    p50_ms: float | None = None
+    p95_ms: float | None = None
+    p99_ms: float | None = None
+    rows: float = 0.0
+    shared_hit: int = 0
+    shared_read: int = 0
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank: значение, не меньше которого pct% выборки."""
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def _timed_out(exc: DBAPIError) -> bool:
+    code = getattr(exc.orig, "sqlstate", None) or getattr(exc.orig, "pgcode", None)
+    return code == _QUERY_CANCELED
+
+
+def _run_once(conn, sql: str, timeout_ms: int) -> dict[str, Any]:
+    sql = sql.strip().rstrip(";")
+    tx = conn.begin()
+    try:
+        # Только чтение и откат: замер не может ничего изменить в базе.
+        conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+        res = conn.execute(
+            text(f"EXPLAIN (ANALYZE, BUFFERS, TIMING OFF, FORMAT JSON) {sql}")
+        )
+        return res.scalars().first()[0]
+    finally:
+        tx.rollback()
+
+
+def run_benchmark(
+    engine: Engine,
+    sql: str,
+    runs: int = 10,
+    warmup: int = 2,
+    timeout_ms: int = 5000,
+    label: str = "",
+) -> BenchResult:
+    """
+    Выполняет запрос warmup + runs раз через EXPLAIN (ANALYZE, BUFFERS):
+    латентность — Planning Time + Execution Time на сервере, без передачи
+    строк клиенту. Буферы — медиана по замерам, строки — у корня плана.
+    После таймаута или ошибки замеры прекращаются.
+    """
+    result = BenchResult(label=label, sql=sql)
+    hits: list[int] = []
+    reads: list[int] = []
+    with engine.connect() as conn:
+        for i in range(warmup + runs):
+            try:
+                out = _run_once(conn, sql, timeout_ms)
+            except DBAPIError as exc:
+                if _timed_out(exc):
+                    result.timeouts += 1
+                else:
+                    result.error = str(exc.orig).strip()
+                break
+            if i < warmup:
+                continue
+            plan = out["Plan"]
+            result.runs += 1
+            result.samples_ms.append(
+                float(out.get("Planning Time", 0.0)) + float(out["Execution Time"])
+            )
+            hits.append(int(plan.get("Shared Hit Blocks", 0)))
+            reads.append(int(plan.get("Shared Read Blocks", 0)))
+            result.rows = float(plan.get("Actual Rows", 0.0))
+
+    if result.samples_ms:
+        ordered = sorted(result.samples_ms)
+        result.p50_ms = percentile(ordered, 50)
+        result.p95_ms = percentile(ordered, 95)
+        result.p99_ms = percentile(ordered, 99)
+        result.shared_hit = int(statistics.median(hits))
+        result.shared_read = int(statistics.median(reads))
+    return result
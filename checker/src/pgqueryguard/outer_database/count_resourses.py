@@ -1,7 +1,25 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Any
 
 
+@dataclass
+class NodeCost:
+    node_id: int
+    depth: int
+    node_type: str
+    relation: str | None
+    total_cost: float
+    self_cost: float
+    loops: float
+    self_time_ms: float | None = None
+
+    @property
+    def label(self) -> str:
+        return (
+            f"{self.node_type} ({self.relation})" if self.relation else self.node_type
+        )
+
+
 @dataclass
 class CostProfile:
     total_cost: float
@@ -11,44 +29,151 @@ class CostProfile:
     est_memory_bytes: float
     nodes: list[tuple[str, float]]
     warnings: list[str]
+    node_costs: list[NodeCost] = field(default_factory=list)
+
+
+@dataclass
+class MemorySettings:
+    work_mem_bytes: int = 4 * 1024 * 1024
+    hash_mem_multiplier: float = 2.0
+    max_parallel_workers_per_gather: int = 2
+
+    @property
+    def hash_mem_bytes(self) -> float:
+        return self.work_mem_bytes * self.hash_mem_multiplier
 
 
 PAGE = 8192
+# Накладные расходы на кортеж в памяти: SortTuple + MinimalTuple header,
+# HashJoinTuple/TupleHashEntry + MinimalTuple header.
+SORT_TUPLE_OVERHEAD = 40
+HASH_TUPLE_OVERHEAD = 48
+# Точная страница в TIDBitmap (PagetableEntry + хэш-слот).
+BITMAP_PAGE_BYTES = 64
+
+_HASH_STRATEGIES = ("Hashed", "Mixed")
+
+
+def _mb(x: float) -> int:
+    return int(x / 1e6)
+
+
+def _node_memory(
+    n: dict[str, Any], settings: MemorySettings, rescans: float
+) -> tuple[float, float, float, str]:
+    """
+    Оценка памяти одного узла в одном процессе.
+    Возвращает (нужно байт, лимит байт, фактическая память из ANALYZE или -1, тип).
+    Тип пустой, если узел не использует work_mem.
+    """
+    nt = n.get("Node Type", "")
+    rows = float(n.get("Plan Rows", 0))
+    width = float(n.get("Plan Width", 0))
+    work_mem = float(settings.work_mem_bytes)
+    hash_mem = settings.hash_mem_bytes
+    strategy = n.get("Strategy")
+
+    if nt in ("Sort", "Incremental Sort"):
+        need = rows * (width + SORT_TUPLE_OVERHEAD)
+        if nt == "Incremental Sort":
+            # Сортируются группы по префиксу ключа, держим только текущую.
+            need = min(need, work_mem)
+        used = n.get("Sort Space Used")
+        actual = float(used) * 1024 if used is not None else -1.0
+        return need, work_mem, actual, nt
+    if nt == "Hash":
+        need = rows * (width + HASH_TUPLE_OVERHEAD)
+        peak = n.get("Peak Memory Usage")
+        actual = float(peak) * 1024 if peak is not None else -1.0
+        return need, hash_mem, actual, "Hash"
+    if nt in ("Aggregate", "SetOp") and strategy in _HASH_STRATEGIES:
+        need = rows * (width + HASH_TUPLE_OVERHEAD)
+        peak = n.get("Peak Memory Usage")
+        actual = float(peak) * 1024 if peak is not None else -1.0
+        return need, hash_mem, actual, f"Hash{nt}"
+    if nt == "Memoize":
+        # Кэш вытесняет записи по LRU и не сбрасывается на диск.
+        need = min(rows * (width + HASH_TUPLE_OVERHEAD) * rescans, hash_mem)
+        peak = n.get("Peak Memory Usage")
+        actual = float(peak) * 1024 if peak is not None else -1.0
+        return need, hash_mem, actual, ""
+    if nt in ("Material", "WindowAgg", "CTE Scan"):
+        kids = n.get("Plans") or []
+        src = kids[0] if kids else n
+        need = float(src.get("Plan Rows", 0)) * (
+            float(src.get("Plan Width", 0)) + SORT_TUPLE_OVERHEAD
+        )
+        return need, work_mem, -1.0, nt
+    if nt == "Bitmap Index Scan":
+        need = rows * BITMAP_PAGE_BYTES
+        return need, work_mem, -1.0, "Bitmap"
+    return 0.0, 0.0, -1.0, ""
 
 
 def estimate_profile(
-    plan_json: dict[str, Any], work_mem_bytes: int = 64 * 1024 * 1024
+    plan_json: dict[str, Any],
+    work_mem_bytes: int = 64 * 1024 * 1024,
+    settings: MemorySettings | None = None,
 ) -> CostProfile:
+    """
+    Профиль запроса по EXPLAIN. Память считается как пик одновременного
+    использования: дети Append исполняются по очереди, параллельные
+    воркеры получают свой work_mem, потребление узла ограничено лимитом
+    (сверх него — spill на диск).
+    """
+    settings = settings or MemorySettings(work_mem_bytes=work_mem_bytes)
     p = plan_json["Plan"]
     warnings: list[str] = []
 
-    def walk(n: dict[str, Any]) -> dict[str, float]:
+    def walk(n: dict[str, Any], processes: int, rescans: float) -> dict[str, float]:
         rows = float(n.get("Plan Rows", 0))
         width = float(n.get("Plan Width", 0))
         node_bytes = rows * width
         node_pages = node_bytes / PAGE
-        mem_need = 0.0
         nt = n.get("Node Type", "")
-        if nt == "Sort":
-            mem_need = node_bytes * 1.2
-            if mem_need > work_mem_bytes:
-                warnings.append(
-                    f"Maybe need spill for Sort (~{int(mem_need / 1e6)} MB > work_mem)"
-                )
-        elif nt.startswith("Hash"):
-            mem_need = node_bytes * 1.3
-            if mem_need > work_mem_bytes:
-                warnings.append(
-                    f"Maybe need spill for Hash (~{int(mem_need / 1e6)} MB > work_mem)"
-                )
-        acc = {"rows": rows, "bytes": node_bytes, "pages": node_pages, "mem": mem_need}
-        for ch in n.get("Plans") or []:
-            c = walk(ch)
-            for k in acc:
-                acc[k] += c[k]
+
+        need, limit, actual, kind = _node_memory(n, settings, rescans)
+        shared = nt == "Hash" and n.get("Parallel Aware")
+        if shared:
+            # Parallel Hash: одна общая таблица, лимит на всех участников.
+            need *= processes
+            limit *= processes
+        if actual >= 0:
+            mem = actual
+        else:
+            mem = min(need, limit) if kind else need
+        if not shared:
+            mem *= processes
+        if kind and need > limit:
+            reason = "lossy bitmap" if kind == "Bitmap" else "spill"
+            limit_name = "hash_mem" if kind.startswith("Hash") else "work_mem"
+            warnings.append(
+                f"Maybe need {reason} for {kind} "
+                f"(~{_mb(need)} MB > {limit_name} {_mb(limit)} MB)"
+            )
+
+        child_processes = processes
+        if nt in ("Gather", "Gather Merge"):
+            workers = min(
+                int(n.get("Workers Planned", 0)),
+                settings.max_parallel_workers_per_gather,
+            )
+            child_processes = workers + 1
+
+        acc = {"bytes": node_bytes, "pages": node_pages, "mem": 0.0}
+        kids_mem: list[float] = []
+        for i, ch in enumerate(n.get("Plans") or []):
+            c = walk(ch, child_processes, rescans * _rescans(ch, n, i))
+            acc["bytes"] += c["bytes"]
+            acc["pages"] += c["pages"]
+            kids_mem.append(c["mem"])
+        if nt == "Append" and not n.get("Parallel Aware"):
+            acc["mem"] = mem + max(kids_mem, default=0.0)
+        else:
+            acc["mem"] = mem + sum(kids_mem)
         return acc
 
-    acc = walk(p)
+    acc = walk(p, 1, 1.0)
     total_cost = float(p.get("Total Cost") or p.get("Plan Rows", 0))
 
     nodes = []
@@ -62,10 +187,79 @@ def estimate_profile(
 
     return CostProfile(
         total_cost=total_cost,
-        est_rows=acc["rows"],
+        est_rows=float(p.get("Plan Rows", 0)),
         est_bytes=acc["bytes"],
         est_pages=acc["pages"],
         est_memory_bytes=acc["mem"],
         nodes=nodes,
         warnings=warnings,
+        node_costs=exclusive_costs(plan_json),
     )
+
+
+def _rescans(n: dict[str, Any], parent: dict[str, Any] | None, idx: int) -> float:
+    # Внутренняя сторона Nested Loop пересканируется на каждую строку внешней.
+    if parent is not None and parent.get("Node Type") == "Nested Loop" and idx == 1:
+        return max(float(parent["Plans"][0].get("Plan Rows", 1)), 1.0)
+    return 1.0
+
+
+def exclusive_costs(plan_json: dict[str, Any]) -> list[NodeCost]:
+    """
+    Собственная (exclusive) стоимость каждого узла: его Total Cost минус
+    стоимость детей с учётом числа пересканирований (loops). Для планов
+    EXPLAIN ANALYZE дополнительно считается собственное время в мс.
+    """
+    p = plan_json.get("Plan", plan_json)
+    out: list[NodeCost] = []
+
+    def walk(
+        n: dict[str, Any],
+        parent: dict[str, Any] | None,
+        idx: int,
+        depth: int,
+        outer_loops: float,
+    ) -> tuple[float, float | None]:
+        loops = outer_loops * _rescans(n, parent, idx)
+        total = float(n.get("Total Cost", 0.0))
+        actual = n.get("Actual Total Time")
+        total_time = (
+            float(actual) * float(n.get("Actual Loops", 1))
+            if actual is not None
+            else None
+        )
+
+        item = NodeCost(
+            node_id=len(out),
+            depth=depth,
+            node_type=n.get("Node Type", ""),
+            relation=n.get("Relation Name"),
+            total_cost=total,
+            self_cost=0.0,
+            loops=float(n.get("Actual Loops", loops)),
+        )
+        out.append(item)
+
+        kids_cost = 0.0
+        kids_time = 0.0
+        for i, ch in enumerate(n.get("Plans") or []):
+            c_cost, c_time = walk(ch, n, i, depth + 1, loops)
+            kids_cost += c_cost
+            kids_time += c_time or 0.0
+
+        item.self_cost = max(total * loops - kids_cost, 0.0)
+        if total_time is not None:
+            item.self_time_ms = max(total_time - kids_time, 0.0)
+        return total * loops, total_time
+
+    walk(p, None, 0, 0, 1.0)
+    return out
+
+
+def top_hotspots(profile: CostProfile, n: int = 5) -> list[NodeCost]:
+    by_time = any(c.self_time_ms is not None for c in profile.node_costs)
+    return sorted(
+        profile.node_costs,
+        key=lambda c: (c.self_time_ms or 0.0) if by_time else c.self_cost,
+        reverse=True,
+    )[:n]
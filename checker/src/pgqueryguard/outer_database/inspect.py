@@ -1,14 +1,22 @@
+from collections.abc import Iterable
 from typing import Any
 
 import sqlglot
 from sqlalchemy import Engine, text
 from sqlglot import exp
 
+from pgqueryguard.outer_database.count_resourses import MemorySettings
 
-def run_explain(engine: Engine, sql: str) -> dict[str, Any]:
+
+def run_explain(
+    engine: Engine, sql: str, timeout_ms: int | None = None
+) -> dict[str, Any]:
     explain_sql = f"EXPLAIN (FORMAT JSON, COSTS true) {sql}"
     with engine.begin() as conn:
         conn.exec_driver_sql("SET default_transaction_read_only = on")
+        if timeout_ms is not None:
+            # Планирование тоже может зависнуть (например, на блокировке).
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
         res = conn.execute(text(explain_sql)).scalars().first()
     return res[0]
 
@@ -25,6 +33,60 @@ def read_table_stats(engine: Engine) -> dict[str, dict[str, Any]]:
     return {r["relname"]: dict(r) for r in rows}
 
 
+def read_memory_settings(engine: Engine) -> MemorySettings:
+    sql = """
+    SELECT name, setting, unit
+    FROM pg_settings
+    WHERE name IN ('work_mem', 'hash_mem_multiplier', 'max_parallel_workers_per_gather');
+    """
+    with engine.begin() as conn:
+        rows = conn.execute(text(sql)).mappings().all()
+    found = {r["name"]: r for r in rows}
+    settings = MemorySettings()
+    if "work_mem" in found:
+        unit = found["work_mem"]["unit"] or "kB"
+        mult = {"B": 1, "kB": 1024, "8kB": 8192, "MB": 1024 * 1024}.get(unit, 1024)
+        settings.work_mem_bytes = int(found["work_mem"]["setting"]) * mult
+    if "hash_mem_multiplier" in found:
+        settings.hash_mem_multiplier = float(found["hash_mem_multiplier"]["setting"])
+    else:
+        # До PostgreSQL 13 hash_mem_multiplier не было, хэши жили в work_mem.
+        settings.hash_mem_multiplier = 1.0
+    if "max_parallel_workers_per_gather" in found:
+        settings.max_parallel_workers_per_gather = int(
+            found["max_parallel_workers_per_gather"]["setting"]
+        )
+    return settings
+
+
+def read_columns(engine: Engine, tables: Iterable[str]) -> dict[str, set[str]]:
+    """
+    Столбцы таблиц и представлений по именам table или schema.table одним
+    запросом к каталогу. Ключи ответа — и relname, и schema.relname;
+    несуществующих таблиц в ответе нет.
+    """
+    names = sorted({t.rsplit(".", 1)[-1] for t in tables})
+    if not names:
+        return {}
+    sql = text("""
+        SELECT n.nspname AS schema_name, c.relname AS table_name, a.attname AS column_name
+          FROM pg_catalog.pg_attribute AS a
+          JOIN pg_catalog.pg_class     AS c ON c.oid = a.attrelid
+          JOIN pg_catalog.pg_namespace AS n ON n.oid = c.relnamespace
+         WHERE a.attnum > 0
+           AND NOT a.attisdropped
+           AND c.relkind IN ('r','p','v','m','f')
+           AND c.relname = ANY(:names)
+    """)
+    out: dict[str, set[str]] = {}
+    with engine.connect() as conn:
+        for r in conn.execute(sql, {"names": names}).mappings():
+            col = r["column_name"]
+            out.setdefault(r["table_name"], set()).add(col)
+            out.setdefault(f"{r['schema_name']}.{r['table_name']}", set()).add(col)
+    return out
+
+
 def get_column_types_from_sql(
     engine: Engine, sql_query: str
 ) -> dict[str, dict[str, str]]:
@@ -0,0 +1,119 @@
+import json
+import math
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+
+from pgqueryguard.query_files.report_index import IndexItem
+
+METRICS = ("total_cost", "est_pages", "est_memory_bytes")
+# Минимальная база для процента: рост с нуля до пары килобайт памяти
+# не должен считаться регрессией в бесконечность процентов.
+_FLOORS = {"total_cost": 1.0, "est_pages": 1.0, "est_memory_bytes": 1024 * 1024}
+
+
+@dataclass
+class Regression:
+    fingerprint: str
+    file: str
+    excerpt: str
+    metric: str
+    baseline: float
+    current: float
+    pct: float
+    error: str | None = None
+
+
+@dataclass
+class BaselineDiff:
+    regressions: list[Regression]
+    new: list[IndexItem]
+    missing: list[IndexItem]
+    compared: int
+
+
+def parse_regression(value: str) -> float:
+    s = value.strip()
+    try:
+        pct = float(s[:-1]) / 100.0 if s.endswith("%") else float(s)
+    except ValueError:
+        raise ValueError(
+            f"expected a fraction or percent, e.g. 20%: {value!r}"
+        ) from None
+    if not pct >= 0:
+        raise ValueError(f"must be non-negative: {value!r}")
+    return pct
+
+
+def load_baseline(path: Path) -> list[IndexItem]:
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    fields = IndexItem.__dataclass_fields__
+    return [IndexItem(**{k: v for k, v in r.items() if k in fields}) for r in raw]
+
+
+def _by_fingerprint(
+    items: Iterable[IndexItem],
+) -> tuple[dict[str, list[IndexItem]], dict[str, list[IndexItem]]]:
+    """Успешные и упавшие запросы, сгруппированные по fingerprint."""
+    ok: dict[str, list[IndexItem]] = defaultdict(list)
+    failed: dict[str, list[IndexItem]] = defaultdict(list)
+    for it in items:
+        if it.fingerprint:
+            (ok if it.error is None else failed)[it.fingerprint].append(it)
+    return ok, failed
+
+
+def compare_with_baseline(
+    current: Iterable[IndexItem],
+    baseline: Iterable[IndexItem],
+    max_regression: float,
+) -> BaselineDiff:
+    """
+    Сопоставляет запросы по fingerprint (одинаковые запросы — по порядку
+    появления) и ищет метрики, выросшие больше чем на max_regression.
+    Запрос, который в baseline проходил, а теперь завершился ошибкой, —
+    тоже регрессия.
+    """
+    cur, cur_failed = _by_fingerprint(current)
+    base, _ = _by_fingerprint(baseline)
+    regressions: list[Regression] = []
+    new: list[IndexItem] = []
+    missing: list[IndexItem] = []
+    compared = 0
+
+    for fp, items in cur.items():
+        olds = base.get(fp, [])
+        new.extend(items[len(olds) :])
+        for it, old in zip(items, olds):
+            compared += 1
+            for m in METRICS:
+                was = float(getattr(old, m, 0.0) or 0.0)
+                now = float(getattr(it, m, 0.0) or 0.0)
+                pct = (now - was) / max(was, _FLOORS[m])
+                if pct > max_regression:
+                    regressions.append(
+                        Regression(fp, it.file, it.excerpt, m, was, now, pct)
+                    )
+    for fp, items in cur_failed.items():
+        olds = base.get(fp, [])[len(cur.get(fp, [])) :]
+        for it, old in zip(items, olds):
+            regressions.append(
+                Regression(
+                    fp,
+                    it.file,
+                    it.excerpt,
+                    "error",
+                    old.total_cost,
+                    0.0,
+                    math.inf,
+                    error=it.error,
+                )
+            )
+    for fp, olds in base.items():
+        matched = len(cur.get(fp, [])) + len(cur_failed.get(fp, []))
+        missing.extend(olds[matched:])
+
+    regressions.sort(key=lambda r: r.pct, reverse=True)
+    return BaselineDiff(regressions, new, missing, compared)
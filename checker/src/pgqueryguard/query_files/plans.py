@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+from pgqueryguard.outer_database.count_resourses import MemorySettings
+
+PLANS_DIR = "plans"
+CONTEXT_FILE = "_context.json"
+PLAN_EXTS = {".json", ".jsonl", ".ndjson"}
+
+
+@dataclass
+class SavedPlan:
+    file: str
+    sql: str
+    plan: dict[str, Any]
+
+
+class PlanWriter:
+    """
+    Сохраняет EXPLAIN JSON вместе с текстом запроса, а в _context.json —
+    статистику таблиц и настройки памяти сервера. Этого достаточно, чтобы
+    повторить анализ через report --from-plans без подключения к БД.
+    """
+
+    def __init__(self, output_dir: str):
+        self.plans_dir = os.path.join(output_dir, PLANS_DIR)
+        os.makedirs(self.plans_dir, exist_ok=True)
+
+    def write_context(
+        self, table_stats: dict[str, dict[str, Any]], settings: MemorySettings
+    ) -> None:
+        context = {"table_stats": table_stats, "memory_settings": asdict(settings)}
+        self._dump(CONTEXT_FILE, context)
+
+    def write(self, file: Path, sql: str, plan: dict[str, Any]) -> None:
+        digest = hashlib.sha1(f"{file}\0{sql}".encode()).hexdigest()[:12]
+        name = f"{Path(file).stem}-{digest}.json"
+        self._dump(name, asdict(SavedPlan(file=str(file), sql=sql, plan=plan)))
+
+    def _dump(self, name: str, payload: dict[str, Any]) -> None:
+        path = os.path.join(self.plans_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, default=str)
+
+
+def load_context(
+    directory: Path,
+) -> tuple[dict[str, dict[str, Any]], MemorySettings | None]:
+    path = directory / CONTEXT_FILE
+    if not path.is_file():
+        return {}, None
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    settings = raw.get("memory_settings")
+    if settings:
+        return raw.get("table_stats") or {}, MemorySettings(**settings)
+    return raw.get("table_stats") or {}, None
+
+
+def _from_json(obj: Any, source: Path) -> Iterator[SavedPlan]:
+    """
+    Понимает три формы: сохранённую --save-plans ({"file", "sql", "plan"}),
+    вывод EXPLAIN (FORMAT JSON) ([{"Plan": ...}]) и запись auto_explain
+    с log_format=json ({"Query Text": ..., "Plan": ...}).
+    """
+    if isinstance(obj, list):
+        for el in obj:
+            yield from _from_json(el, source)
+    elif isinstance(obj, dict) and "plan" in obj:
+        yield SavedPlan(
+            file=obj.get("file") or str(source),
+            sql=obj.get("sql") or "",
+            plan=obj["plan"],
+        )
+    elif isinstance(obj, dict) and "Plan" in obj:
+        plan = {k: v for k, v in obj.items() if k != "Query Text"}
+        yield SavedPlan(file=str(source), sql=obj.get("Query Text") or "", plan=plan)
+    else:
+        raise ValueError(f"{source}: not an EXPLAIN (FORMAT JSON) document")
+
+
+def load_plan_file(path: Path) -> list[SavedPlan]:
+    """Планы из .json или .jsonl (по одному документу на строку)."""
+    with open(path, encoding="utf-8") as f:
+        if path.suffix.lower() == ".json":
+            return list(_from_json(json.load(f), path))
+        plans = []
+        for line in f:
+            if line.strip():
+                plans.extend(_from_json(json.loads(line), path))
+        return plans
+
+
+def get_plan_files(path: Path, recursive: bool) -> list[Path]:
+    if path.is_file():
+        return [path] if path.suffix.lower() in PLAN_EXTS else []
+    it = path.rglob("*") if recursive else path.glob("*")
+    return sorted(
+        p
+        for p in it
+        if p.is_file() and p.suffix.lower() in PLAN_EXTS and p.name != CONTEXT_FILE
+    )
@@ -1,11 +1,15 @@
+import base64
+import gzip
 import html
 import json
+import os
 import textwrap
 from datetime import datetime
+from string import Template
 from typing import Any
 
 from pgqueryguard.outer_database.advice import Advice
-from pgqueryguard.outer_database.count_resourses import CostProfile
+from pgqueryguard.outer_database.count_resourses import CostProfile, top_hotspots
 
 
 def fmt_num(x: float) -> str:
@@ -135,6 +139,46 @@ def plan_nodes_table(plan_json: dict[str, Any]) -> str:
 """
 
 
+def hotspots_table(profile: CostProfile, top_n: int = 5) -> str:
+    hot = top_hotspots(profile, top_n)
+    if not hot:
+        return '<p class="muted">Нет данных об узлах плана.</p>'
+    total_self = sum(c.self_cost for c in profile.node_costs) or 1.0
+    has_time = any(c.self_time_ms is not None for c in hot)
+    rows_html = []
+    for c in hot:
+        time_td = (
+            f'<td class="num">{fmt_float(c.self_time_ms or 0.0, 3)}</td>'
+            if has_time
+            else ""
+        )
+        rows_html.append(f"""
+<tr>
+  <td>#{c.node_id} {_escape(c.node_type)}</td>
+  <td>{_escape(c.relation or "")}</td>
+  <td class="num">{fmt_float(c.self_cost)}</td>
+  <td class="num">{fmt_float(c.self_cost / total_self * 100, 1)}%</td>
+  <td class="num">{fmt_float(c.total_cost)}</td>
+  <td class="num">{fmt_num(c.loops)}</td>
+  {time_td}
+</tr>
+""")
+    time_th = "<th>Self time, ms</th>" if has_time else ""
+    return f"""
+<table class="nodes">
+  <thead>
+    <tr>
+      <th>Node</th><th>Relation</th><th>Self cost</th><th>Доля</th>
+      <th>Total</th><th>Loops</th>{time_th}
+    </tr>
+  </thead>
+  <tbody>
+    {"".join(rows_html)}
+  </tbody>
+</table>
+"""
+
+
 def advice_section(advice: list[Advice]) -> str:
     if not advice:
         return '<p class="muted">Рекомендации не найдены - план выглядит разумно.</p>'
@@ -172,30 +216,121 @@ def advice_section(advice: list[Advice]) -> str:
     return '<div class="cards">' + "".join(cards) + "</div>"
 
 
-def write_html_report(
-    filepath: str,
-    plan_json: dict[str, Any],
-    profile: CostProfile,
-    advice: list[Advice],
-    sql_text: str | None = None,
-    db_dsn_label: str | None = None,
-) -> None:
-    risk_lvl, risk_note = risk_from_profile(profile)
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    sql_block = (
-        f'<pre class="sql"><code>{_escape(sql_text.strip())}</code></pre>'
-        if sql_text
-        else ""
+def _fmt_pct_signed(v) -> str:
+    try:
+        return f"{-float(v):+.1f}%"
+    except (TypeError, ValueError):
+        return "—"
+
+
+def _warn_delta_and_class(v) -> tuple[str, str]:
+    """Вернёт ('+3', 'low') / ('-1', 'high') / ('0', '') / ('—','')"""
+    try:
+        iv = int(v)
+    except (TypeError, ValueError):
+        return "—", ""
+    cls = "low" if iv > 0 else ("high" if iv < 0 else "")
+    return f"{iv:+d}", cls
+
+
+def ai_card(i: int, cand: dict) -> str:
+    sql = (cand.get("sql") or "").strip()
+    explanation = cand.get("explanation") or ""
+    changes = cand.get("changes") or []
+    tags = cand.get("tags") or []
+    imp = cand.get("improvement") or {}
+
+    tags_html = "".join(f"<span class='badge'>{_escape(str(t))}</span>" for t in tags)
+    warn_delta_str, warn_cls = _warn_delta_and_class(imp.get("warnings_diff", 0))
+
+    # Замер латентности есть, только если его запросили (bench).
+    bench = cand.get("bench") or {}
+    latency_chip = ""
+    if bench.get("p50_ms") is not None and not (
+        bench.get("error") or bench.get("timeouts")
+    ):
+        latency_chip = (
+            f'\n  <span class="badge">p50: {fmt_float(bench["p50_ms"])} ms '
+            f"({_fmt_pct_signed(imp.get('latency_pct'))})</span>"
+        )
+    elif bench:
+        latency_chip = '\n  <span class="badge high">p50: timeout/error</span>'
+
+    chips = f"""
+<div class="chips">
+  <span class="badge">Cost: {fmt_float(cand.get("c_cost") or 0)} ({_fmt_pct_signed(imp.get("cost_pct"))})</span>
+  <span class="badge">Pages: {fmt_num(cand.get("c_pages") or 0)} ({_fmt_pct_signed(imp.get("pages_pct"))})</span>
+  <span class="badge">Memory: {fmt_bytes(cand.get("c_mem") or 0)} ({_fmt_pct_signed(imp.get("memory_pct"))})</span>
+  <span class="badge">Rows: {fmt_num(cand.get("c_rows") or 0)} ({_fmt_pct_signed(imp.get("rows_pct"))})</span>
+  <span class="badge {warn_cls}">Warnings Δ {warn_delta_str}</span>
+  <span class="badge">Score: {fmt_float(imp.get("weighted_geom_ratio") or 0)}</span>{latency_chip}
+</div>"""
+
+    changes_html = ""
+    if changes:
+        items = "".join(f"<li>{_escape(str(it))}</li>" for it in changes)
+        changes_html = (
+            f"<div class='ddl-head'>Изменения</div><ul class='warn-list'>{items}</ul>"
+        )
+
+    return f"""
+<div class="card">
+  <div class="card-top">
+    <div><b>Вариант {i}</b></div>
+    <div class="chips">{tags_html}</div>
+  </div>
+  <div class="msg">{_escape(explanation)}</div>
+  {chips}
+  <div class="ddl-head">SQL (улучшенный)</div>
+  <pre class="sql"><code>{_escape(sql)}</code></pre>
+  <button class="copy" onclick="copyDDL(this)">Копировать</button>
+  {changes_html}
+</div>"""
+
+
+def ai_advice_section(ai_advice: list[dict] | None) -> str:
+    if not ai_advice:
+        return "<div class='muted'>Нет AI-вариантов, прошедших фильтр по EXPLAIN.</div>"
+    cards = "".join(ai_card(i, cand) for i, cand in enumerate(ai_advice, 1))
+    return f"<div class='cards'>{cards}</div>"
+
+
+# Потоковый отчёт: страница уходит в браузер сразу после EXPLAIN с пустым
+# слотом, а каждая карточка дописывается в конец ответа и переносится в слот.
+_AI_STREAM_SLOT = """
+<div class="section">
+  <h3>AI рекомендации</h3>
+  <div class="cards" id="ai-cards"></div>
+  <div class="muted" id="ai-status">Генерируем и проверяем варианты…</div>
+  <script>
+    function aiAppend(id){
+      const tpl = document.getElementById(id);
+      document.getElementById('ai-cards').appendChild(tpl.content.cloneNode(true));
+      tpl.remove();
+    }
+    function aiDone(text){ document.getElementById('ai-status').textContent = text; }
+  </script>
+</div>"""
+
+
+def ai_stream_card(i: int, cand: dict) -> str:
+    return (
+        f"<template id='ai-{i}'>{ai_card(i, cand)}</template>"
+        f"<script>aiAppend('ai-{i}')</script>\n"
     )
-    warnings_html = "".join(f"<li>{_escape(w)}</li>" for w in (profile.warnings or []))
-    if warnings_html:
-        warnings_html = f'<ul class="warn-list">{warnings_html}</ul>'
-    plan_tree = plan_to_tree_html(plan_json)
-    nodes_table = plan_nodes_table(plan_json)
-    advice_html = advice_section(advice)
-    plan_raw_json = html.escape(json.dumps(plan_json, ensure_ascii=False, indent=2))
-
-    css = """
+
+
+_SCRIPT_UNSAFE = str.maketrans({"<": "\\u003c", ">": "\\u003e", "&": "\\u0026"})
+
+
+def ai_stream_done(status: str) -> str:
+    # Статус может содержать текст ошибки провайдера: "</script>" внутри
+    # JSON закрыл бы тег, поэтому <, > и & идут как \uXXXX.
+    text = json.dumps(status, ensure_ascii=False).translate(_SCRIPT_UNSAFE)
+    return f"<script>aiDone({text})</script>\n"
+
+
+REPORT_CSS = """
 :root {
   --bg: #0b1020; --fg: #E7ECF4; --muted:#9AA6B2; --card:#121a33; --acc:#7C9BFF;
   --ok:#3fb950; --med:#f2cc60; --high:#ff6b6b; --chip:#1b2447; --border:#22305b;
@@ -246,9 +381,10 @@ pre{background:#0a0f1f1a;border:1px solid var(--border);border-radius:12px;paddi
 .muted{color:var(--muted)}
 .footer{color:var(--muted);font-size:12px;margin-top:8px;display:flex;gap:16px;flex-wrap:wrap}
 .kv b{color:var(--muted);font-weight:600}
+.lazy > summary{cursor:pointer;color:var(--acc);font-weight:600}
 """
 
-    js = """
+REPORT_JS = """
 function copyDDL(btn){
   const pre = btn.previousElementSibling?.querySelector('code');
   if(!pre) return;
@@ -259,71 +395,243 @@ function copyDDL(btn){
     setTimeout(()=>btn.innerText = old, 1200);
   });
 }
+
+async function inflateBase64(b64){
+  const bytes = Uint8Array.from(atob(b64), c => c.charCodeAt(0));
+  const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+  return await new Response(stream).text();
+}
+
+// Тяжёлые секции разворачиваются только при первом открытии <details class="lazy">.
+async function expandLazy(d){
+  const tpl = d.querySelector(':scope > template');
+  if(tpl){ d.appendChild(tpl.content.cloneNode(true)); tpl.remove(); }
+  const blob = d.dataset.raw && document.getElementById(d.dataset.raw);
+  if(blob){
+    const code = d.querySelector('code');
+    try{
+      const raw = await inflateBase64(blob.textContent.trim());
+      code.textContent = JSON.stringify(JSON.parse(raw), null, 2);
+    }catch(e){
+      code.textContent = 'Не удалось распаковать план: ' + e;
+    }
+    blob.remove();
+  }
+}
+
+document.querySelectorAll('details.lazy').forEach(d => {
+  d.addEventListener('toggle', () => { if(d.open) expandLazy(d); }, {once: true});
+});
 """
 
-    html_doc = f"""<!doctype html>
-<html lang="ru">
-<head>
-  <meta charset="utf-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <title>SQL Advisor Report</title>
-  <style>{css}</style>
-</head>
-<body>
-  <div class="container">
-    <div class="header">
-      <div class="h-title">SQL Advisor - отчёт анализа запроса</div>
-      <div class="chips">
-        <span class="badge">{_escape(db_dsn_label or "PostgreSQL (read-only)")}</span>
-        <span class="badge">{_escape(now)}</span>
-        <span class="badge {"high" if risk_lvl == "HIGH" else ("med" if risk_lvl == "MED" else "low")}">{_escape("RISK: " + risk_lvl)}</span>
-      </div>
-      <div class="h-sub">{_escape(risk_note)}</div>
-    </div>
-
-    {"<div class='section'><div class='kpi'><div class='label'>SQL</div></div>" + sql_block + "</div>" if sql_text else ""}
-
-    <div class="section">
-      <div class="grid">
-        <div class="kpi"><div class="label">Total Cost</div><div class="value">{fmt_float(profile.total_cost)}</div></div>
-        <div class="kpi"><div class="label">Оценка строк</div><div class="value">{fmt_num(profile.est_rows)}</div></div>
-        <div class="kpi"><div class="label">Сканируемые данные</div><div class="value">{fmt_bytes(profile.est_bytes)}</div></div>
-        <div class="kpi"><div class="label">Страницы (8KB)</div><div class="value">{fmt_num(profile.est_pages)}</div></div>
-        <div class="kpi"><div class="label">Память (Sort/Hash)</div><div class="value">{fmt_bytes(profile.est_memory_bytes)}</div></div>
-        <div class="kpi"><div class="label">Узлов в плане</div><div class="value">{fmt_num(len(profile.nodes))}</div></div>
-        <div class="kpi"><div class="label">Предупреждений</div><div class="value">{fmt_num(len(profile.warnings))}</div></div>
+# Номер версии рендера: меняется вместе с разметкой/стилями отчёта.
+RENDERER_VERSION = "3"
+ASSETS_DIR = "assets"
+
+# Шаблоны собираются один раз на процесс; на каждый отчёт — только substitute.
+_PAGE = Template(
+    textwrap.dedent("""\
+    <!doctype html>
+    <html lang="ru">
+    <head>
+      <meta charset="utf-8">
+      <meta name="viewport" content="width=device-width, initial-scale=1">
+      <title>SQL Advisor Report</title>
+      $styles
+    </head>
+    <body>
+      <div class="container">
+        <div class="header">
+          <div class="h-title">SQL Advisor - отчёт анализа запроса</div>
+          <div class="chips">
+            <span class="badge">$dsn_label</span>
+            <span class="badge">$now</span>
+            <span class="badge $risk_class">RISK: $risk_lvl</span>
+          </div>
+          <div class="h-sub">$risk_note</div>
+        </div>
+
+        $sql_section
+
+        <div class="section">
+          <div class="grid">
+            <div class="kpi"><div class="label">Total Cost</div><div class="value">$total_cost</div></div>
+            <div class="kpi"><div class="label">Оценка строк</div><div class="value">$est_rows</div></div>
+            <div class="kpi"><div class="label">Сканируемые данные</div><div class="value">$est_bytes</div></div>
+            <div class="kpi"><div class="label">Страницы (8KB)</div><div class="value">$est_pages</div></div>
+            <div class="kpi"><div class="label">Пиковая память</div><div class="value">$est_memory</div></div>
+            <div class="kpi"><div class="label">Узлов в плане</div><div class="value">$nodes_count</div></div>
+            <div class="kpi"><div class="label">Предупреждений</div><div class="value">$warnings_count</div></div>
+          </div>
+          $warnings_section
+        </div>
+
+        $ai_section
+
+        <div class="section">
+          <h3>Горячие узлы (собственная стоимость)</h3>
+          $hotspots
+        </div>
+
+        <div class="section">
+          <h3>Дерево плана (EXPLAIN JSON)</h3>
+          <details class="lazy">
+            <summary>Показать дерево</summary>
+            <template>$plan_tree</template>
+          </details>
+        </div>
+
+        <div class="section">
+          <h3>Узлы плана (сводная таблица)</h3>
+          <details class="lazy">
+            <summary>Показать таблицу</summary>
+            <template>$nodes_table</template>
+          </details>
+        </div>
+
+        <div class="section">
+          <h3>Рекомендации</h3>
+          $advice
+        </div>
+
+        <div class="section">
+          <h3>EXPLAIN (FORMAT JSON) - исходник</h3>
+          <details class="lazy" data-raw="plan-raw">
+            <summary>Показать исходник</summary>
+            <pre><code></code></pre>
+          </details>
+          <script type="application/gzip+base64" id="plan-raw">$plan_raw</script>
+        </div>
+
+        <div class="footer">
+          <span>Сгенерировано офлайн-репортом</span>
+          <span>Подготовлено для PostgreSQL 15+</span>
+        </div>
       </div>
-      {"<div class='section warn'><div class='title'>Предупреждения</div>" + warnings_html + "</div>" if profile.warnings else ""}
-    </div>
-
-    <div class="section">
-      <h3>Дерево плана (EXPLAIN JSON)</h3>
-      {plan_tree}
-    </div>
-
-    <div class="section">
-      <h3>Узлы плана (сводная таблица)</h3>
-      {nodes_table}
-    </div>
-
-    <div class="section">
-      <h3>Рекомендации</h3>
-      {advice_html}
-    </div>
-
-    <div class="section">
-      <h3>EXPLAIN (FORMAT JSON) - исходник</h3>
-      <pre><code>{plan_raw_json}</code></pre>
-    </div>
-
-    <div class="footer">
-      <span>Сгенерировано офлайн-репортом</span>
-      <span>Подготовлено для PostgreSQL 15+</span>
-    </div>
-  </div>
-<script>{js}</script>
-</body>
-</html>
-"""
+    $scripts
+    </body>
+    </html>
+    """)
+)
+_INLINE_ASSETS = (
+    f"<style>{REPORT_CSS}</style>",
+    f"<script>{REPORT_JS}</script>",
+)
+
+
+def pack_plan(plan_json: dict[str, Any]) -> str:
+    """
+    Компактный JSON плана, сжатый gzip и закодированный в base64. Браузер
+    распаковывает его только при раскрытии секции с исходником.
+    """
+    raw = json.dumps(plan_json, ensure_ascii=False, separators=(",", ":"))
+    return base64.b64encode(gzip.compress(raw.encode("utf-8"), mtime=0)).decode()
+
+
+def write_report_assets(output_dir: str) -> str:
+    """
+    Пишет общие report.css/report.js в output_dir/assets один раз на прогон
+    (файл не трогается, если содержимое не изменилось). Возвращает путь к папке.
+    """
+    assets = os.path.join(output_dir, ASSETS_DIR)
+    os.makedirs(assets, exist_ok=True)
+    for name, content in (("report.css", REPORT_CSS), ("report.js", REPORT_JS)):
+        path = os.path.join(assets, name)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                if f.read() == content:
+                    continue
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+    return assets
+
+
+def render_html_report(
+    plan_json: dict[str, Any],
+    profile: CostProfile,
+    advice: list[Advice] | None,
+    sql_text: str | None = None,
+    db_dsn_label: str | None = None,
+    ai_advice: list[dict] | None = None,
+    assets_href: str | None = None,
+    ai_stream: bool = False,
+) -> str:
+    """
+    Единый рендер отчёта для CLI, LLM CLI и веб-бэкенда. С assets_href
+    стили и скрипт подключаются ссылками на общие файлы, без него — inline.
+    С ai_stream вместо AI-секции — пустой слот под ai_stream_card().
+    """
+    risk_lvl, risk_note = risk_from_profile(profile)
+    if assets_href is None:
+        styles, scripts = _INLINE_ASSETS
+    else:
+        styles = f'<link rel="stylesheet" href="{_escape(assets_href)}/report.css">'
+        scripts = f'<script src="{_escape(assets_href)}/report.js"></script>'
+
+    sql_section = ""
+    if sql_text:
+        sql_section = (
+            "<div class='section'><div class='kpi'><div class='label'>SQL</div></div>"
+            f'<pre class="sql"><code>{_escape(sql_text.strip())}</code></pre></div>'
+        )
+    warnings_section = ""
+    if profile.warnings:
+        items = "".join(f"<li>{_escape(w)}</li>" for w in profile.warnings)
+        warnings_section = (
+            "<div class='section warn'><div class='title'>Предупреждения</div>"
+            f'<ul class="warn-list">{items}</ul></div>'
+        )
+    ai_section = ""
+    if ai_stream:
+        ai_section = _AI_STREAM_SLOT
+    elif ai_advice:
+        ai_section = (
+            "<div class='section'><h3>AI рекомендации</h3>"
+            f"{ai_advice_section(ai_advice)}</div>"
+        )
+
+    return _PAGE.substitute(
+        styles=styles,
+        scripts=scripts,
+        dsn_label=_escape(db_dsn_label or "PostgreSQL (read-only)"),
+        now=_escape(datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+        risk_class={"HIGH": "high", "MED": "med"}.get(risk_lvl, "low"),
+        risk_lvl=_escape(risk_lvl),
+        risk_note=_escape(risk_note),
+        sql_section=sql_section,
+        total_cost=fmt_float(profile.total_cost),
+        est_rows=fmt_num(profile.est_rows),
+        est_bytes=fmt_bytes(profile.est_bytes),
+        est_pages=fmt_num(profile.est_pages),
+        est_memory=fmt_bytes(profile.est_memory_bytes),
+        nodes_count=fmt_num(len(profile.nodes)),
+        warnings_count=fmt_num(len(profile.warnings)),
+        warnings_section=warnings_section,
+        ai_section=ai_section,
+        hotspots=hotspots_table(profile),
+        plan_tree=plan_to_tree_html(plan_json),
+        nodes_table=plan_nodes_table(plan_json),
+        advice=advice_section(advice or []),
+        plan_raw=pack_plan(plan_json),
+    )
+
+
+def write_html_report(
+    filepath: str,
+    plan_json: dict[str, Any],
+    profile: CostProfile,
+    advice: list[Advice],
+    sql_text: str | None = None,
+    db_dsn_label: str | None = None,
+    ai_advice: list[dict] | None = None,
+    assets_dir: str | None = None,
+) -> None:
+    assets_href = None
+    if assets_dir is not None:
+        rel = os.path.relpath(assets_dir, os.path.dirname(os.path.abspath(filepath)))
+        assets_href = rel.replace("\\", "/")
+    html_doc = render_html_report(
+        plan_json, profile, advice, sql_text, db_dsn_label, ai_advice, assets_href
+    )
     with open(filepath, "w", encoding="utf-8") as f:
-        f.write(textwrap.dedent(html_doc).strip())
+        f.write(html_doc)
@@ -1,7 +1,38 @@
 import html
 import json
 import os
-from dataclasses import asdict, dataclass
+import re
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import asdict, dataclass, field
+from itertools import pairwise
+from string import Template
+
+DATA_DIR = "data"
+SHARD_SIZE = 5000
+SORT_KEYS = (
+    "title",
+    "top_hotspot",
+    "risk",
+    "total_cost",
+    "est_pages",
+    "est_bytes",
+    "warnings",
+)
+_RISK_RANK = {"LOW": 0, "MED": 1, "HIGH": 2, "ERROR": 3}
+# Поля, которые нужны странице; остальное остаётся только в manifest.json.
+_PAGE_FIELDS = (
+    "title",
+    "file",
+    "report_rel",
+    "risk",
+    "total_cost",
+    "est_pages",
+    "est_bytes",
+    "warnings",
+    "excerpt",
+    "top_hotspot",
+)
 
 
 @dataclass
@@ -16,92 +47,236 @@ class IndexItem:
     warnings: int
     excerpt: str
     error: str | None = None
+    top_hotspot: str = ""
+    fingerprint: str = ""
+    est_memory_bytes: float = 0.0
+    tables: list[str] = field(default_factory=list)
+    plan_nodes: list[str] = field(default_factory=list)
 
 
-def write_index_page(
-    output_dir: str,
-    items: list[IndexItem],
-    title: str = "SQL Advisor — отчёты",
-    manifest: bool = True,
-) -> None:
-    os.makedirs(output_dir, exist_ok=True)
-    index_path = os.path.join(output_dir, "index.html")
+_TOKEN_RE = re.compile(r"[a-z0-9_]{2,}")
+_PLAN_NODE_RE = re.compile(r"^(.*?)(?: \((.+)\))?$")
+
+
+def _node_key(node_type: str) -> str:
+    return node_type.replace(" ", "").lower()
+
+
+def search_tokens(item: IndexItem) -> set[str]:
+    """
+    Токены для поиска: слова из имени/пути/SQL, таблицы, типы узлов плана
+    (`seqscan`) и пары узел:таблица (`seqscan:rental`).
+    """
+    text = " ".join((item.title, item.file, item.excerpt, " ".join(item.tables)))
+    tokens = set(_TOKEN_RE.findall(text.lower()))
+    for label in item.plan_nodes:
+        m = _PLAN_NODE_RE.match(label)
+        node = _node_key(m.group(1))
+        tokens.add(node)
+        if m.group(2):
+            tokens.add(f"{node}:{m.group(2).lower()}")
+    return tokens
+
 
-    data_js = json.dumps([asdict(i) for i in items], ensure_ascii=False)
+def _delta(ids: list[int]) -> list[int]:
+    return [ids[0]] + [b - a for a, b in pairwise(ids)]
 
-    css = """
+
+_CSS = """
 :root{--bg:#0b1020;--fg:#E7ECF4;--muted:#9AA6B2;--card:#121a33;--border:#22305b;--chip:#1b2447;--high:#ff6b6b;--med:#f2cc60;--ok:#3fb950}
 @media (prefers-color-scheme: light){:root{--bg:#f7f9fc;--fg:#0c1220;--muted:#697586;--card:#ffffff;--border:#e5e9f2;--chip:#eef2ff}}
 *{box-sizing:border-box} body{margin:0;background:var(--bg);color:var(--fg);font:14px/1.5 ui-sans-serif,system-ui,-apple-system,Segoe UI,Roboto,Arial}
 .container{max-width:1200px;margin:0 auto;padding:16px}
 .header{padding:8px 0 14px;border-bottom:1px solid var(--border);display:flex;gap:10px;align-items:center;justify-content:space-between}
 .h1{font-size:18px;font-weight:700}
-.controls{display:flex;gap:8px;margin:12px 0;flex-wrap:wrap}
+.controls{display:flex;gap:8px;margin:12px 0;flex-wrap:wrap;align-items:center}
+.status{color:var(--muted);font-size:12px}
 input[type=search],select{padding:8px 10px;border:1px solid var(--border);border-radius:10px;background:var(--chip);color:var(--fg)}
 select{max-width:140px}
-.table{width:100%;border-collapse:collapse;border:1px solid var(--border);border-radius:12px;overflow:hidden}
-.table tr{cursor:pointer}
-.table tr:hover{background:rgba(124,155,255,.08)}
-.table th,.table td{border-bottom:1px solid var(--border);padding:10px}
-.table td.num{text-align:right}
+.scroller{height:calc(100vh - 120px);overflow-y:auto;border:1px solid var(--border);border-radius:12px}
+.table{width:100%;border-collapse:collapse;table-layout:fixed}
+.table thead th{position:sticky;top:0;background:var(--card);z-index:1;cursor:pointer;text-align:left}
+.table tbody tr.row{cursor:pointer;height:58px}
+.table tbody tr.row:hover{background:rgba(124,155,255,.08)}
+.table th,.table td{border-bottom:1px solid var(--border);padding:8px 10px;overflow:hidden}
+.table td.num,.table th.num{text-align:right}
 .badge{display:inline-block;padding:2px 8px;border-radius:999px;border:1px solid var(--border);font-size:12px}
 .low{background:rgba(63,185,80,.12);color:var(--ok);border-color:rgba(63,185,80,.35)}
 .med{background:rgba(242,204,96,.12);color:var(--med);border-color:rgba(242,204,96,.35)}
 .high{background:rgba(255,107,107,.12);color:var(--high);border-color:rgba(255,107,107,.35)}
 .err{background:#3f1d1d;color:#ffb4b4;border-color:#6b1d1d}
-.excerpt{color:var(--muted);font-size:12px;white-space:nowrap;text-overflow:ellipsis;overflow:hidden;max-width:520px}
+.title{white-space:nowrap;text-overflow:ellipsis;overflow:hidden}
+.excerpt{color:var(--muted);font-size:12px;white-space:nowrap;text-overflow:ellipsis;overflow:hidden}
+.hot{color:var(--muted);font-size:12px;white-space:nowrap;text-overflow:ellipsis}
 a.rowlink{color:inherit;text-decoration:none}
-    """
+"""
+
+# Данные грузятся шардами data/items-NNNN.js (JSONP, чтобы работало и с file://),
+# порядок сортировки по каждой колонке заранее посчитан в data/order.js,
+# поисковый инвертированный индекс — в data/search.js.
+# В DOM живут только видимые строки таблицы.
+_JS = Template("""
+const META = $meta;
+const ROW_H = 58, OVERSCAN = 10;
+const ITEMS = new Array(META.total);
+let ORDER = null, SEARCH = null, loaded = 0, view = [];
+let sortKey = null, sortDir = 1, timer = null;
 
-    js = (
-        """
-const DATA = %s;
-let sortKey = "title", sortDir = 1;
 function riskClass(r){return r==="HIGH"?"high":r==="MED"?"med":r==="LOW"?"low":"err"}
-function esc(s){return (s||"").replaceAll("&","&amp;").replaceAll("<","&lt;").replaceAll(">","&gt;")}
-function openReport(rel){ window.location.href = rel; } // переход в той же вкладке
-function setSort(k){ if(sortKey===k) sortDir*=-1; else {sortKey=k; sortDir=1;} render(); }
-function render(){
+function esc(s){return String(s??"").replaceAll("&","&amp;").replaceAll("<","&lt;").replaceAll(">","&gt;").replaceAll('"',"&quot;")}
+function loadScript(src){
+  return new Promise((ok, fail)=>{
+    const s = document.createElement("script");
+    s.src = src; s.onload = ok; s.onerror = fail;
+    document.head.appendChild(s);
+  });
+}
+window.pgqgShard = function(n, rows){
+  const base = n * META.shardSize;
+  for(let i = 0; i < rows.length; i++){
+    const x = rows[i];
+    x._s = (x.title + " " + x.file + " " + (x.excerpt || "") + " " + (x.top_hotspot || "")).toLowerCase();
+    ITEMS[base + i] = x;
+  }
+  loaded += rows.length;
+};
+window.pgqgOrder = function(order){ ORDER = order; };
+window.pgqgSearch = function(idx){ SEARCH = idx; };
+
+function lowerBound(arr, key){
+  let lo = 0, hi = arr.length;
+  while(lo < hi){ const mid = (lo + hi) >> 1; if(arr[mid] < key) lo = mid + 1; else hi = mid; }
+  return lo;
+}
+function postingIds(t){
+  const i = lowerBound(SEARCH.vocab, t);
+  if(SEARCH.vocab[i] !== t) return null;
+  const out = [], p = SEARCH.postings[i];
+  let id = 0;
+  for(let k = 0; k < p.length; k++){ id += p[k]; out.push(id); }
+  return out;
+}
+function prefixMask(t){
+  // Последнее слово запроса — префикс: объединяем все токены словаря с ним.
+  const mask = new Uint8Array(META.total);
+  for(let i = lowerBound(SEARCH.vocab, t); i < SEARCH.vocab.length && SEARCH.vocab[i].startsWith(t); i++){
+    let id = 0;
+    for(const d of SEARCH.postings[i]){ id += d; mask[id] = 1; }
+  }
+  return mask;
+}
+function queryTerms(q){
+  // "Seq Scan rental" -> ["seqscan:rental"]: склеиваем слова в тип узла
+  // и пару узел:таблица, если такие токены есть в словаре.
+  const words = q.toLowerCase().match(/[a-z0-9_]+/g) || [];
+  const has = t => SEARCH.vocab[lowerBound(SEARCH.vocab, t)] === t;
+  const terms = [];
+  for(let i = 0; i < words.length; i++){
+    let t = words[i];
+    for(let j = i + 1; j < words.length && j < i + 3; j++){
+      if(has(words.slice(i, j + 1).join(""))){ t = words.slice(i, j + 1).join(""); i = j; }
+    }
+    const prev = terms[terms.length - 1];
+    if(prev && has(prev + ":" + t)){ terms[terms.length - 1] = prev + ":" + t; continue; }
+    terms.push(t);
+  }
+  return terms;
+}
+function searchMask(q){
+  const terms = queryTerms(q);
+  if(!terms.length) return null;
+  let mask = prefixMask(terms[terms.length - 1]);
+  for(const t of terms.slice(0, -1)){
+    const ids = postingIds(t);
+    const next = new Uint8Array(META.total);
+    if(ids) for(const id of ids) if(mask[id]) next[id] = 1;
+    mask = next;
+  }
+  return mask;
+}
+
+function rebuild(){
   const q = document.querySelector("#q").value.toLowerCase();
   const rf = document.querySelector("#risk").value;
-  const tbody = document.querySelector("#tbody");
-  let rows = DATA.filter(x => 
-    (rf==="ALL" || x.risk===rf) &&
-    (x.title.toLowerCase().includes(q) || x.file.toLowerCase().includes(q) || (x.excerpt||"").toLowerCase().includes(q))
-  );
-  rows.sort((a,b)=>{
-    let va=a[sortKey], vb=b[sortKey];
-    if(typeof va==="string") va=va.toLowerCase();
-    if(typeof vb==="string") vb=vb.toLowerCase();
-    return (va>vb?1:va<vb?-1:0)*sortDir;
-  });
-  tbody.innerHTML = rows.map(x=>`
-    <tr onclick="openReport('${x.report_rel}')">
+  const order = sortKey && ORDER ? ORDER[sortKey] : null;
+  const n = META.total;
+  const mask = q && SEARCH ? searchMask(q) : null;
+  view = [];
+  for(let k = 0; k < n; k++){
+    const i = order ? order[sortDir > 0 ? k : n - 1 - k] : k;
+    const x = ITEMS[i];
+    if(!x) continue;
+    if(rf !== "ALL" && x.risk !== rf) continue;
+    if(mask ? !mask[i] : q && !x._s.includes(q)) continue;
+    view.push(i);
+  }
+  document.querySelector("#status").textContent =
+    view.length.toLocaleString() + " / " + META.total.toLocaleString() +
+    (loaded < META.total ? " (загружено " + loaded.toLocaleString() + ")" : "");
+  draw();
+}
+function draw(){
+  const sc = document.querySelector("#scroller");
+  const first = Math.max(0, Math.floor(sc.scrollTop / ROW_H) - OVERSCAN);
+  const last = Math.min(view.length, Math.ceil((sc.scrollTop + sc.clientHeight) / ROW_H) + OVERSCAN);
+  let out = `<tr style="height:$${first * ROW_H}px"></tr>`;
+  for(let k = first; k < last; k++){
+    const x = ITEMS[view[k]];
+    out += `
+    <tr class="row" data-href="$${esc(x.report_rel)}">
       <td>
-        <a class="rowlink" href="${x.report_rel}">${esc(x.title)}</a>
-        <div class="excerpt" title="${esc(x.file)}">${esc(x.excerpt)}</div>
+        <div class="title"><a class="rowlink" href="$${esc(x.report_rel)}">$${esc(x.title)}</a></div>
+        <div class="excerpt" title="$${esc(x.file)}">$${esc(x.excerpt)}</div>
       </td>
-      <td><span class="badge ${riskClass(x.risk)}">${x.risk}</span></td>
-      <td class="num">${(x.total_cost||0).toFixed(2)}</td>
-      <td class="num">${Math.round(x.est_pages||0).toLocaleString()}</td>
-      <td class="num">${Math.round((x.est_bytes||0)/1024/1024)} MB</td>
-      <td class="num">${x.warnings||0}</td>
-    </tr>`).join("");
+      <td class="hot">$${esc(x.top_hotspot)}</td>
+      <td><span class="badge $${riskClass(x.risk)}">$${esc(x.risk)}</span></td>
+      <td class="num">$${(x.total_cost||0).toFixed(2)}</td>
+      <td class="num">$${Math.round(x.est_pages||0).toLocaleString()}</td>
+      <td class="num">$${Math.round((x.est_bytes||0)/1024/1024)} MB</td>
+      <td class="num">$${x.warnings||0}</td>
+    </tr>`;
+  }
+  out += `<tr style="height:$${(view.length - last) * ROW_H}px"></tr>`;
+  document.querySelector("#tbody").innerHTML = out;
 }
-window.addEventListener("DOMContentLoaded", render);
-"""
-        % data_js
-    )
+function schedule(){ clearTimeout(timer); timer = setTimeout(rebuild, 150); }
+function setSort(k){ if(sortKey===k) sortDir*=-1; else {sortKey=k; sortDir=1;} rebuild(); }
+
+window.addEventListener("DOMContentLoaded", async () => {
+  const sc = document.querySelector("#scroller");
+  let ticking = false;
+  sc.addEventListener("scroll", () => {
+    if(ticking) return;
+    ticking = true;
+    requestAnimationFrame(() => { ticking = false; draw(); });
+  });
+  document.querySelector("#tbody").addEventListener("click", (e) => {
+    const tr = e.target.closest("tr.row");
+    if(tr && !e.target.closest("a")) window.location.href = tr.dataset.href;
+  });
+  rebuild();
+  for(let n = 0; n < META.shards; n++){
+    await loadScript(META.dataDir + "/items-" + String(n).padStart(4, "0") + ".js");
+    rebuild();
+  }
+  await loadScript(META.dataDir + "/search.js");
+  if(document.querySelector("#q").value) rebuild();
+  await loadScript(META.dataDir + "/order.js");
+  if(sortKey) rebuild();
+});
+""")
 
-    html_doc = f"""<!doctype html>
-<meta charset="utf-8"><title>{html.escape(title)}</title>
-<style>{css}</style>
+_PAGE = Template(
+    """<!doctype html>
+<meta charset="utf-8"><title>$title</title>
+<style>$css</style>
 <div class="container">
   <div class="header">
-    <div class="h1">{html.escape(title)}</div>
+    <div class="h1">$title</div>
     <div class="controls">
-      <input id="q" type="search" placeholder="Поиск по имени/пути/SQL..." oninput="render()">
-      <select id="risk" onchange="render()">
+      <span class="status" id="status"></span>
+      <input id="q" type="search" placeholder="Поиск: путь, SQL, таблица, Seq Scan rental..." oninput="schedule()">
+      <select id="risk" onchange="rebuild()">
         <option value="ALL">Все риски</option>
         <option value="HIGH">HIGH</option>
         <option value="MED">MED</option>
@@ -111,28 +286,121 @@ window.addEventListener("DOMContentLoaded", render);
     </div>
   </div>
 
-  <table class="table">
-    <thead>
-      <tr>
-        <th onclick="setSort('title')">Файл</th>
-        <th onclick="setSort('risk')">Риск</th>
-        <th onclick="setSort('total_cost')">Cost</th>
-        <th onclick="setSort('est_pages')">Страницы</th>
-        <th onclick="setSort('est_bytes')">Данные</th>
-        <th onclick="setSort('warnings')">Warn</th>
-      </tr>
-    </thead>
-    <tbody id="tbody"></tbody>
-  </table>
+  <div class="scroller" id="scroller">
+    <table class="table">
+      <colgroup>
+        <col><col style="width:180px"><col style="width:80px"><col style="width:110px">
+        <col style="width:100px"><col style="width:90px"><col style="width:70px">
+      </colgroup>
+      <thead>
+        <tr>
+          <th onclick="setSort('title')">Файл</th>
+          <th onclick="setSort('top_hotspot')">Горячий узел</th>
+          <th onclick="setSort('risk')">Риск</th>
+          <th class="num" onclick="setSort('total_cost')">Cost</th>
+          <th class="num" onclick="setSort('est_pages')">Страницы</th>
+          <th class="num" onclick="setSort('est_bytes')">Данные</th>
+          <th class="num" onclick="setSort('warnings')">Warn</th>
+        </tr>
+      </thead>
+      <tbody id="tbody"></tbody>
+    </table>
+  </div>
 </div>
-<script>{js}</script>
+<script>$js</script>
 """
+)
+
+
+def _sort_key(item: IndexItem, key: str):
+    if key == "risk":
+        return _RISK_RANK.get(item.risk, 3)
+    value = getattr(item, key)
+    return value.lower() if isinstance(value, str) else float(value or 0)
+
+
+def _write_shard(data_dir: str, n: int, rows: list[dict]) -> None:
+    path = os.path.join(data_dir, f"items-{n:04d}.js")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"pgqgShard({n},")
+        json.dump(rows, f, ensure_ascii=False, separators=(",", ":"))
+        f.write(");\n")
 
-    with open(index_path, "w", encoding="utf-8") as f:
-        f.write(html_doc)
 
-    if manifest:
-        with open(
-            os.path.join(output_dir, "manifest.json"), "w", encoding="utf-8"
-        ) as f:
-            json.dump([asdict(i) for i in items], f, ensure_ascii=False, indent=2)
+def write_index_page(
+    output_dir: str,
+    items: Iterable[IndexItem],
+    title: str = "SQL Advisor — отчёты",
+    manifest: bool = True,
+) -> None:
+    """
+    Пишет index.html, шарды данных для него и manifest.json потоково:
+    items может быть генератором (например, из results.jsonl). В памяти
+    держится один шард и ключи сортировки, а не все элементы.
+    """
+    data_dir = os.path.join(output_dir, DATA_DIR)
+    os.makedirs(data_dir, exist_ok=True)
+    for name in os.listdir(data_dir):
+        if name.startswith("items-") and name.endswith(".js"):
+            os.remove(os.path.join(data_dir, name))
+
+    keys: dict[str, list] = {k: [] for k in SORT_KEYS}
+    postings: dict[str, list[int]] = defaultdict(list)
+    shard: list[dict] = []
+    shards = 0
+    total = 0
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    with open(manifest_path if manifest else os.devnull, "w", encoding="utf-8") as m:
+        m.write("[")
+        for item in items:
+            data = asdict(item)
+            entry = json.dumps(data, ensure_ascii=False, indent=2)
+            m.write(("," if total else "") + "\n  " + entry.replace("\n", "\n  "))
+            for k in SORT_KEYS:
+                keys[k].append(_sort_key(item, k))
+            for token in search_tokens(item):
+                postings[token].append(total)
+            shard.append({k: data[k] for k in _PAGE_FIELDS})
+            total += 1
+            if len(shard) == SHARD_SIZE:
+                _write_shard(data_dir, shards, shard)
+                shards += 1
+                shard = []
+        m.write("\n]\n")
+    if shard:
+        _write_shard(data_dir, shards, shard)
+        shards += 1
+
+    order = {
+        k: sorted(range(total), key=values.__getitem__) for k, values in keys.items()
+    }
+    with open(os.path.join(data_dir, "order.js"), "w", encoding="utf-8") as f:
+        f.write("pgqgOrder(")
+        json.dump(order, f, separators=(",", ":"))
+        f.write(");\n")
+
+    # Инвертированный индекс: отсортированный словарь и списки id в дельта-кодировке.
+    vocab = sorted(postings)
+    with open(os.path.join(data_dir, "search.js"), "w", encoding="utf-8") as f:
+        f.write("pgqgSearch(")
+        json.dump(
+            {"vocab": vocab, "postings": [_delta(postings[t]) for t in vocab]},
+            f,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        f.write(");\n")
+
+    meta = {
+        "total": total,
+        "shards": shards,
+        "shardSize": SHARD_SIZE,
+        "dataDir": DATA_DIR,
+    }
+    html_doc = _PAGE.substitute(
+        title=html.escape(title),
+        css=_CSS,
+        js=_JS.substitute(meta=json.dumps(meta)),
+    )
+    with open(os.path.join(output_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(html_doc)
@@ -0,0 +1,64 @@
+import json
+import os
+from collections.abc import Iterator
+from dataclasses import asdict
+from typing import Any, Self
+
+from pgqueryguard.outer_database.advice import Advice
+from pgqueryguard.outer_database.count_resourses import CostProfile
+from pgqueryguard.query_files.report_index import IndexItem
+
+RESULTS_FILE = "results.jsonl"
+
+
+class ResultsWriter:
+    """
+    Поток результатов анализа: одна JSON-строка на запрос, пишется и
+    сбрасывается на диск сразу после анализа. При падении длинного прогона
+    всё, что уже посчитано, остаётся в файле.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = None
+
+    def __enter__(self) -> Self:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._f = open(self.path, "w", encoding="utf-8")
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._f:
+            self._f.close()
+            self._f = None
+
+    def write(
+        self,
+        item: IndexItem,
+        profile: CostProfile,
+        advice: list[Advice],
+        timings: dict[str, float],
+    ) -> None:
+        record = {
+            "item": asdict(item),
+            "profile": asdict(profile),
+            "advice": [asdict(a) for a in advice],
+            "timings_ms": timings,
+        }
+        self._f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._f.flush()
+
+
+def iter_results(path: str) -> Iterator[dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                # Оборванная последняя строка после падения процесса.
+                break
+            yield json.loads(line)
+
+
+def iter_index_items(path: str) -> Iterator[IndexItem]:
+    fields = IndexItem.__dataclass_fields__
+    for record in iter_results(path):
+        yield IndexItem(**{k: v for k, v in record["item"].items() if k in fields})
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+from dataclasses import asdict
+from typing import Any
+
+from pgqueryguard.outer_database.advice import Advice
+from pgqueryguard.outer_database.count_resourses import CostProfile
+from pgqueryguard.query_files.report import RENDERER_VERSION, write_html_report
+
+REPORTS_DIR = "reports"
+
+
+def report_key(
+    sql_text: str,
+    plan_json: dict[str, Any],
+    profile: CostProfile,
+    advice: list[Advice],
+    ai_advice: list[dict] | None = None,
+) -> str:
+    """
+    Хэш всего, что попадает в отчёт: текст запроса, план, профиль (зависит
+    от настроек сервера), советы и версия рендера.
+    """
+    payload = {
+        "renderer": RENDERER_VERSION,
+        "sql": sql_text,
+        "plan": plan_json,
+        "profile": asdict(profile),
+        "advice": [asdict(a) for a in advice],
+        "ai_advice": ai_advice or [],
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+class ReportStore:
+    """
+    Отчёты хранятся по хэшу содержимого: reports/ab/abcdef....html.
+    Неизменившийся отчёт не перезаписывается, а gc() удаляет отчёты,
+    на которые не сослался текущий прогон.
+    """
+
+    def __init__(self, output_dir: str, assets_dir: str | None = None):
+        self.output_dir = output_dir
+        self.reports_dir = os.path.join(output_dir, REPORTS_DIR)
+        self.assets_dir = assets_dir
+        self.live: set[str] = set()
+        self.written = 0
+        self.reused = 0
+
+    def put(
+        self,
+        plan_json: dict[str, Any],
+        profile: CostProfile,
+        advice: list[Advice],
+        sql_text: str,
+        db_dsn_label: str | None = None,
+        ai_advice: list[dict] | None = None,
+    ) -> str:
+        """Возвращает путь отчёта относительно output_dir."""
+        key = report_key(sql_text, plan_json, profile, advice, ai_advice)
+        rel = f"{REPORTS_DIR}/{key[:2]}/{key}.html"
+        path = os.path.join(self.output_dir, rel)
+        self.live.add(os.path.normpath(path))
+        if os.path.exists(path):
+            self.reused += 1
+            return rel
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        write_html_report(
+            tmp,
+            plan_json,
+            profile,
+            advice,
+            sql_text,
+            db_dsn_label,
+            ai_advice=ai_advice,
+            assets_dir=self.assets_dir,
+        )
+        os.replace(tmp, path)
+        self.written += 1
+        return rel
+
+    def gc(self) -> int:
+        removed = 0
+        if not os.path.isdir(self.reports_dir):
+            return removed
+        for root, _, names in os.walk(self.reports_dir, topdown=False):
+            for name in names:
+                path = os.path.normpath(os.path.join(root, name))
+                if path not in self.live:
+                    os.remove(path)
+                    removed += 1
+            if root != self.reports_dir and not os.listdir(root):
+                os.rmdir(root)
+        return removed
@@ -1,8 +1,26 @@
+from enum import StrEnum
 from pathlib import Path
 
 import typer
 from typing_extensions import Annotated
 
+from pgqueryguard.query_files.baseline import parse_regression
+
+
+class ReportFormat(StrEnum):
+    HTML = "html"
+    JSONL = "jsonl"
+
+
+def _check_regression(value: str) -> str:
+    # Проверяем при разборе опций, а не после EXPLAIN всех файлов.
+    try:
+        parse_regression(value)
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc))
+    return value
+
+
 PathArgument = Annotated[Path, typer.Argument(exists=True, readable=True)]
 RecursiveOption = Annotated[
     bool,
@@ -45,3 +63,102 @@ DBUrlOption = Annotated[
         help="Url for database connection",
     ),
 ]
+BaselineOption = Annotated[
+    Path | None,
+    typer.Option(
+        "--baseline",
+        exists=True,
+        readable=True,
+        help="Path to manifest.json of a previous report to compare costs with",
+    ),
+]
+MaxRegressionOption = Annotated[
+    str,
+    typer.Option(
+        "--max-regression",
+        callback=_check_regression,
+        help="Allowed growth of cost/pages/memory vs baseline, e.g. 20%",
+    ),
+]
+ReportFormatOption = Annotated[
+    ReportFormat,
+    typer.Option(
+        "--format",
+        help="jsonl: stream one result per statement to results.jsonl as it is "
+        "analysed and build the index from that stream",
+    ),
+]
+GcOption = Annotated[
+    bool,
+    typer.Option(
+        "--gc",
+        help="Delete reports that are no longer referenced by the index",
+    ),
+]
+FromPlansOption = Annotated[
+    bool,
+    typer.Option(
+        "--from-plans",
+        help="Treat DIRECTORY as saved EXPLAIN JSON (--save-plans or auto_explain) "
+        "and analyse it without a database connection",
+    ),
+]
+SavePlansOption = Annotated[
+    bool,
+    typer.Option(
+        "--save-plans",
+        help="Save EXPLAIN JSON, table stats and memory settings to "
+        "pgqueryguard_reports/plans for later --from-plans runs",
+    ),
+]
+ProfileOption = Annotated[
+    bool,
+    typer.Option(
+        "--profile",
+        help="Print wall/CPU time and peak allocations per stage and per file",
+    ),
+]
+ProfileTraceOption = Annotated[
+    Path | None,
+    typer.Option(
+        "--profile-trace",
+        help="Write a Chrome trace-event JSON (chrome://tracing, Perfetto); "
+        "implies --profile",
+    ),
+]
+BenchRunsOption = Annotated[
+    int,
+    typer.Option("--runs", min=1, help="Measured executions per statement"),
+]
+BenchWarmupOption = Annotated[
+    int,
+    typer.Option("--warmup", min=0, help="Unmeasured executions before the runs"),
+]
+BenchTimeoutOption = Annotated[
+    float,
+    typer.Option(
+        "--timeout",
+        min=0.001,
+        help="statement_timeout for every execution, seconds",
+    ),
+]
+BenchVariantOption = Annotated[
+    list[Path] | None,
+    typer.Option(
+        "--variant",
+        exists=True,
+        readable=True,
+        help="SQL file with a rewritten variant to measure against FILE; repeatable",
+    ),
+]
+BenchOptimizedOption = Annotated[
+    bool,
+    typer.Option(
+        "--optimized",
+        help="Also measure the sqlglot-optimized rewrite of FILE (as check --fix)",
+    ),
+]
+BenchOutputOption = Annotated[
+    Path | None,
+    typer.Option("--output", help="Write results as JSON to this path"),
+]
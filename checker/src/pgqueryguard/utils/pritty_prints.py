@@ -1,6 +1,11 @@
 from pathlib import Path
 
 from rich.console import Console
+from rich.table import Table
+
+from pgqueryguard.outer_database.bench import BenchResult
+from pgqueryguard.query_files.baseline import BaselineDiff
+from pgqueryguard.utils.profiling import Profiler
 
 console = Console(force_terminal=True)
 
@@ -24,6 +29,18 @@ def print_validation_errors(errors: list, file: Path):
         )
 
 
+def print_budget_violations(violations: list[str], file: Path, excerpt: str):
+    console.print(f"===[red] {file} [/red]=== budget exceeded")
+    console.print(f"[white]{excerpt}[/white]")
+    for v in violations:
+        console.print(f"  [red]✗[/red] {v}")
+
+
+def print_plan_file_error(file: Path, message: str):
+    console.print(f"===[red] {file} [/red]=== invalid plan file")
+    console.print(message)
+
+
 def print_total_format_files(formatted: int, errors: int):
     if formatted == 1:
         console.print(f"=== [green]{formatted}[/green] file was formatted ===")
@@ -33,3 +50,108 @@ def print_total_format_files(formatted: int, errors: int):
         console.print(f"=== [red]{errors}[/red] file has error ===")
     elif formatted > 1:
         console.print(f"=== [red]{errors}[/red] files have error ===")
+
+
+def print_baseline_diff(diff: BaselineDiff, max_regression: float):
+    console.print(
+        f"=== Baseline: compared [bold]{diff.compared}[/bold] statements, "
+        f"{len(diff.new)} new, {len(diff.missing)} missing ==="
+    )
+    if not diff.regressions:
+        console.print(
+            f"=== [green]No regressions above {max_regression:.0%}[/green] ==="
+        )
+        return
+    table = Table(title=f"Regressions above {max_regression:.0%}")
+    table.add_column("File")
+    table.add_column("Statement", max_width=60, overflow="ellipsis")
+    table.add_column("Metric")
+    table.add_column("Baseline", justify="right")
+    table.add_column("Current", justify="right")
+    table.add_column("Change", justify="right", style="red")
+    for r in diff.regressions:
+        if r.error is not None:
+            # Запрос был в baseline, а теперь падает.
+            table.add_row(r.file, r.excerpt, r.metric, "ok", r.error[:60], "failed")
+            continue
+        table.add_row(
+            r.file,
+            r.excerpt,
+            r.metric,
+            f"{r.baseline:,.2f}",
+            f"{r.current:,.2f}",
+            f"+{r.pct:.0%}",
+        )
+    console.print(table)
+
+
+def print_profile(profiler: Profiler, top_n: int = 10):
+    table = Table(title="Profile by stage")
+    table.add_column("Stage")
+    for col in ("Calls", "Wall, ms", "Max, ms", "CPU, ms", "Peak alloc, MB"):
+        table.add_column(col, justify="right")
+    for r in profiler.summary():
+        table.add_row(
+            r.stage,
+            str(r.calls),
+            f"{r.wall_ms:,.1f}",
+            f"{r.max_wall_ms:,.1f}",
+            f"{r.cpu_ms:,.1f}",
+            f"{r.peak_bytes / 1024 / 1024:,.2f}",
+        )
+    console.print(table)
+
+    slowest = profiler.slowest(top_n)
+    if not slowest:
+        return
+    table = Table(title=f"Slowest {len(slowest)} files/statements")
+    table.add_column("Stage")
+    table.add_column("File / statement", max_width=60, overflow="ellipsis")
+    table.add_column("Wall, ms", justify="right")
+    table.add_column("CPU, ms", justify="right")
+    table.add_column("Peak alloc, MB", justify="right")
+    for s in slowest:
+        table.add_row(
+            s.stage,
+            s.label,
+            f"{s.wall_ms:,.1f}",
+            f"{s.cpu_ms:,.1f}",
+            f"{s.peak_bytes / 1024 / 1024:,.2f}",
+        )
+    console.print(table)
+
+
+def print_bench_results(results: list[BenchResult]):
+    def ms(v: float | None) -> str:
+        return "—" if v is None else f"{v:,.2f}"
+
+    base = results[0].p50_ms if results else None
+    table = Table(title="Latency (EXPLAIN ANALYZE, server side)")
+    table.add_column("Statement", max_width=50, overflow="ellipsis")
+    for col in ("Runs", "p50, ms", "p95, ms", "p99, ms", "Δ p50", "Rows"):
+        table.add_column(col, justify="right")
+    table.add_column("Buffers hit / read", justify="right")
+    table.add_column("Status")
+    for r in results:
+        delta = ""
+        if r is not results[0] and base and r.p50_ms is not None:
+            pct = (r.p50_ms - base) / base
+            delta = f"[{'green' if pct < 0 else 'red'}]{pct:+.0%}[/]"
+        if r.error:
+            status = f"[red]{r.error.splitlines()[0]}[/red]"
+        elif r.timeouts:
+            status = "[red]timeout[/red]"
+        else:
+            status = "[green]ok[/green]"
+        table.add_row(
+            r.label,
+            str(r.runs),
+            ms(r.p50_ms),
+            ms(r.p95_ms),
+            ms(r.p99_ms),
+            delta,
+            f"{r.rows:,.0f}",
+            f"{r.shared_hit:,} / {r.shared_read:,}",
+            status,
+        )
+    console.print(table)
@@ -0,0 +1,133 @@
+import json
+import os
+import time
+import tracemalloc
+from collections.abc import Iterator
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Span:
+    stage: str
+    label: str
+    start_us: float
+    wall_ms: float
+    cpu_ms: float
+    peak_bytes: int
+
+
+@dataclass
+class StageSummary:
+    stage: str
+    calls: int = 0
+    wall_ms: float = 0.0
+    max_wall_ms: float = 0.0
+    cpu_ms: float = 0.0
+    peak_bytes: int = 0
+
+
+@dataclass
+class _Frame:
+    start_mem: int
+    # Максимум пиков вложенных этапов: reset_peak() внутри них стирает наш пик.
+    child_peak: int = 0
+
+
+@dataclass
+class Profiler:
+    """
+    Замеры по этапам (чтение, парсинг, EXPLAIN, рендер...) и по каждому
+    файлу/запросу: wall time, CPU time и пик аллокаций через tracemalloc.
+    Выключенный профайлер ничего не меряет, stage() — пустой контекст.
+    """
+
+    enabled: bool = False
+    spans: list[Span] = field(default_factory=list)
+    _stack: list[_Frame] = field(default_factory=list)
+    _t0: float = field(default_factory=time.perf_counter)
+
+    def start(self) -> None:
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self) -> None:
+        if self.enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def stage(self, name: str, label: str = ""):
+        if not self.enabled:
+            return nullcontext()
+        return self._measure(name, label)
+
+    @contextmanager
+    def _measure(self, name: str, label: str) -> Iterator[None]:
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1].child_peak = max(self._stack[-1].child_peak, peak)
+            tracemalloc.reset_peak()
+        else:
+            current = 0
+        frame = _Frame(start_mem=current)
+        self._stack.append(frame)
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall1, cpu1 = time.perf_counter(), time.process_time()
+            self._stack.pop()
+            peak = 0
+            if tracing:
+                peak = max(tracemalloc.get_traced_memory()[1], frame.child_peak)
+                if self._stack:
+                    self._stack[-1].child_peak = max(self._stack[-1].child_peak, peak)
+            self.spans.append(
+                Span(
+                    stage=name,
+                    label=label,
+                    start_us=(wall0 - self._t0) * 1e6,
+                    wall_ms=(wall1 - wall0) * 1000,
+                    cpu_ms=(cpu1 - cpu0) * 1000,
+                    peak_bytes=max(peak - frame.start_mem, 0),
+                )
+            )
+
+    def summary(self) -> list[StageSummary]:
+        out: dict[str, StageSummary] = {}
+        for s in self.spans:
+            row = out.setdefault(s.stage, StageSummary(stage=s.stage))
+            row.calls += 1
+            row.wall_ms += s.wall_ms
+            row.max_wall_ms = max(row.max_wall_ms, s.wall_ms)
+            row.cpu_ms += s.cpu_ms
+            row.peak_bytes = max(row.peak_bytes, s.peak_bytes)
+        return sorted(out.values(), key=lambda r: r.wall_ms, reverse=True)
+
+    def slowest(self, n: int = 10) -> list[Span]:
+        labelled = (s for s in self.spans if s.label)
+        return sorted(labelled, key=lambda s: s.wall_ms, reverse=True)[:n]
+
+    def write_chrome_trace(self, path: str) -> None:
+        """Формат trace-event: открывается в chrome://tracing и Perfetto."""
+        pid = os.getpid()
+        events = [
+            {
+                "name": s.stage,
+                "cat": "pgqueryguard",
+                "ph": "X",
+                "ts": s.start_us,
+                "dur": s.wall_ms * 1000,
+                "pid": pid,
+                "tid": 0,
+                "args": {
+                    "label": s.label,
+                    "cpu_ms": round(s.cpu_ms, 3),
+                    "peak_bytes": s.peak_bytes,
+                },
+            }
+            for s in self.spans
+        ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
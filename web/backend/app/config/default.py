@@ -8,6 +8,42 @@ class DefaultSettings(BaseSettings):
     OPENAI_API_KEY: str | None = None
     DEEPSEEK_API_KEY: str | None = None
 
+    # Кэш движков по DSN: сколько держать, когда закрывать, размер пула на DSN.
+    DB_ENGINE_CACHE_SIZE: int = 16
+    DB_ENGINE_IDLE_TIMEOUT: float = 300.0
+    DB_POOL_SIZE: int = 2
+    DB_MAX_OVERFLOW: int = 2
+    DB_POOL_TIMEOUT: float = 10.0
+    # Потоков под синхронные запросы к БД (EXPLAIN) на процесс.
+    DB_WORKERS: int = 8
+
+    # Кэш ответов LLM: записей в памяти, TTL в секундах, SQLite-файл (None — без диска).
+    LLM_CACHE_SIZE: int = 256
+    LLM_CACHE_TTL: float = 7 * 24 * 3600
+    LLM_CACHE_PATH: str | None = None
+
+    # HTTP-клиент LLM: повторы на 429/5xx, задержка (секунды), соединений на провайдера.
+    LLM_MAX_RETRIES: int = 3
+    LLM_BACKOFF_BASE: float = 0.5
+    LLM_BACKOFF_MAX: float = 10.0
+    LLM_MAX_CONNECTIONS: int = 20
+
+    # Фоновые отчёты: SQLite со статусами/результатами, сколько хранить (секунды),
+    # задач одновременно на процесс и на один DSN.
+    REPORT_JOBS_PATH: str = "report_jobs.sqlite3"
+    REPORT_JOBS_TTL: float = 24 * 3600
+    REPORT_JOBS_WORKERS: int = 4
+    REPORT_JOBS_PER_DSN: int = 2
+    # Пакетная загрузка (.zip или несколько запросов): запросов в работе одновременно и всего,
+    # предел размера ZIP (и суммы распакованных .sql) в байтах.
+    REPORT_BATCH_CONCURRENCY: int = 4
+    REPORT_BATCH_MAX_STATEMENTS: int = 500
+    REPORT_BATCH_MAX_ARCHIVE_BYTES: int = 50_000_000
+    # Замер латентности кандидатов (флажок в форме): выполнений, прогревов, таймаут (секунды).
+    BENCH_RUNS: int = 5
+    BENCH_WARMUP: int = 1
+    BENCH_TIMEOUT: float = 5.0
+
 settings: DefaultSettings | None = None
 
 def get_settings() -> DefaultSettings:
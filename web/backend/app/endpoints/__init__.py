@@ -1,7 +1,9 @@
 from .doc import api_router as doc_router
+from .metrics import api_router as metrics_router
 
 list_of_routes = [
-    doc_router
+    doc_router,
+    metrics_router,
 ]
 __all__ = [
     "list_of_routes",
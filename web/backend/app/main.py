@@ -1,13 +1,45 @@
+import asyncio
+import contextlib
+from contextlib import asynccontextmanager
+
 from uvicorn import run
 from fastapi import FastAPI
 from app.endpoints import list_of_routes
 from app.config import DefaultSettings, get_settings
+from app import metrics
+from app.utils.db import get_engine_registry, shutdown_db_executor
+from app.utils.jobs import get_job_queue
+from app.utils.llm.http import get_llm_http
 
 def bindRoutes(application: FastAPI, setting: DefaultSettings) -> None:
      for route in list_of_routes:
        application.include_router(route, prefix=setting.PATH_PREFIX)
 
 
+@asynccontextmanager
+async def lifespan(application: FastAPI):
+    engines = get_engine_registry()
+
+    async def prune_idle_engines() -> None:
+        while True:
+            await asyncio.sleep(max(engines.idle_timeout / 4, 1.0))
+            await asyncio.to_thread(engines.prune)
+
+    task = asyncio.create_task(prune_idle_engines())
+    jobs = get_job_queue()
+    await jobs.start()
+    try:
+        yield
+    finally:
+        await jobs.stop()
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        await get_llm_http().aclose()
+        shutdown_db_executor()
+        engines.dispose_all()
+
+
 def getApp() -> FastAPI:
     description = "Микросервис для анализа SQL"
     application = FastAPI(
@@ -16,10 +48,12 @@ def getApp() -> FastAPI:
         version="1.0.0",
         title="SQL отчеты",
         description=description,
+        lifespan=lifespan,
     )
 
     settings = get_settings()
     bindRoutes(application, settings)
+    metrics.install(application)
     application.state.settings = settings
     return application
 
@@ -0,0 +1,114 @@
+import time
+import weakref
+
+from fastapi import FastAPI, Request
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import REGISTRY, Collector
+from sqlalchemy import Engine
+
+# Бакеты под медленные запросы: EXPLAIN — десятки мс, LLM — десятки секунд.
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+REQUEST_LATENCY = Histogram(
+    "pgqg_http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+    buckets=_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "pgqg_http_requests_in_flight",
+    "Requests currently being processed",
+)
+REPORT_STAGE_LATENCY = Histogram(
+    "pgqg_report_stage_duration_seconds",
+    "Time spent in each stage of report generation",
+    ["stage"],
+    buckets=_BUCKETS,
+)
+REPORT_JOBS = Gauge(
+    "pgqg_report_jobs",
+    "Background report jobs by status",
+    ["status"],
+)
+LLM_ERRORS = Counter(
+    "pgqg_llm_errors_total",
+    "Failed LLM calls by kind",
+    ["kind"],
+)
+LLM_RETRIES = Counter(
+    "pgqg_llm_retries_total",
+    "Retried LLM HTTP calls (429/5xx/network errors)",
+    ["provider"],
+)
+LLM_CANDIDATES = Counter(
+    "pgqg_llm_candidates_total",
+    "LLM candidates by local check result: accepted, invalid, duplicate, same_as_baseline, unknown_schema",
+    ["result"],
+)
+LLM_CACHE_REQUESTS = Counter(
+    "pgqg_llm_cache_requests_total",
+    "LLM cache lookups by result: memory_hit, disk_hit, miss",
+    ["result"],
+)
+
+
+def stage(name: str):
+    """with stage("explain"): ... — замер одного этапа отчёта."""
+    return REPORT_STAGE_LATENCY.labels(name).time()
+
+
+_engines: "weakref.WeakSet[Engine]" = weakref.WeakSet()
+
+
+def track_engine(engine: Engine) -> Engine:
+    """Пул движка попадёт в pgqg_db_pool_connections, пока движок жив."""
+    _engines.add(engine)
+    return engine
+
+
+class _PoolCollector(Collector):
+    def collect(self):
+        gauge = GaugeMetricFamily(
+            "pgqg_db_pool_connections",
+            "Connections in SQLAlchemy pools of live engines",
+            labels=["state"],
+        )
+        checked_out = idle = overflow = 0
+        engines = list(_engines)
+        for engine in engines:
+            pool = engine.pool
+            checked_out += getattr(pool, "checkedout", lambda: 0)()
+            idle += getattr(pool, "checkedin", lambda: 0)()
+            overflow += max(getattr(pool, "overflow", lambda: 0)(), 0)
+        gauge.add_metric(["checked_out"], checked_out)
+        gauge.add_metric(["idle"], idle)
+        gauge.add_metric(["overflow"], overflow)
+        yield gauge
+        yield GaugeMetricFamily(
+            "pgqg_db_engines", "Live SQLAlchemy engines", value=len(engines)
+        )
+
+
+REGISTRY.register(_PoolCollector())
+
+
+def install(application: FastAPI) -> None:
+    @application.middleware("http")
+    async def _measure(request: Request, call_next):
+        REQUESTS_IN_FLIGHT.inc()
+        t0 = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            # Шаблон пути, а не сам путь: иначе метки разрастутся.
+            route = request.scope.get("route")
+            REQUEST_LATENCY.labels(
+                request.method,
+                getattr(route, "path", "unmatched"),
+                str(status),
+            ).observe(time.perf_counter() - t0)
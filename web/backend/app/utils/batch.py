@@ -0,0 +1,244 @@
+import asyncio
+import io
+import os
+import tempfile
+import zipfile
+from pathlib import PurePosixPath
+from typing import Optional
+
+import sqlparse
+from fastapi import HTTPException, UploadFile
+from pgqueryguard.checkers.fingerprint import fingerprint
+from pgqueryguard.outer_database.count_resourses import (
+    CostProfile,
+    estimate_profile,
+    top_hotspots,
+)
+from pgqueryguard.query_files.report import write_report_assets
+from pgqueryguard.query_files.report_index import IndexItem, write_index_page
+from pgqueryguard.query_files.storage import ReportStore
+from sqlalchemy import Engine
+
+from app.metrics import stage
+from app.utils.db import explain, memory_settings
+from app.utils.llm.query_improve import improve_and_filter_sql
+
+SQL_FILE_LIMIT = 1_000_000
+_CHUNK = 64 * 1024
+
+
+def decode_sql(data: bytes) -> str:
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("cp1251", errors="strict")
+
+
+def split_sql(text: str) -> list[str]:
+    """Операторы без комментариев; пустые (только комментарии) отброшены."""
+    out = []
+    for stmt in sqlparse.split(text):
+        stmt = sqlparse.format(stmt, strip_comments=True).strip().rstrip(";").strip()
+        if stmt:
+            out.append(stmt)
+    return out
+
+
+async def _read_limited(file: UploadFile, limit: int) -> bytes:
+    # Кусками: файл больше лимита отвергается, не попадая в память целиком.
+    chunks, size = [], 0
+    while chunk := await file.read(_CHUNK):
+        size += len(chunk)
+        if size > limit:
+            raise HTTPException(
+                status_code=413, detail=f"SQL файл слишком большой (> {limit} байт)"
+            )
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _zip_statements(
+    fileobj, max_statements: int, limit: int, archive_limit: int
+) -> list[tuple[str, str]]:
+    # Размер архива целиком — до zipfile: лимит на файл его не ограничивает.
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    if size > archive_limit:
+        raise HTTPException(
+            status_code=413, detail=f"ZIP слишком большой (> {archive_limit} байт)"
+        )
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile as e:
+        raise HTTPException(status_code=400, detail=f"Битый ZIP: {e}")
+    out: list[tuple[str, str]] = []
+    unpacked = 0
+    with archive:
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or not name.lower().endswith(".sql"):
+                continue
+            if PurePosixPath(name).name.startswith("."):
+                continue
+            # file_size из каталога архива может врать — читаем с тем же лимитом.
+            with archive.open(info) as member:
+                data = member.read(limit + 1)
+            if info.file_size > limit or len(data) > limit:
+                raise HTTPException(
+                    status_code=413, detail=f"{name}: файл больше {limit} байт"
+                )
+            unpacked += len(data)
+            if unpacked > archive_limit:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"ZIP распаковывается больше чем в {archive_limit} байт",
+                )
+            out += [(name, stmt) for stmt in split_sql(decode_sql(data))]
+            if len(out) > max_statements:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Больше {max_statements} запросов в одной загрузке",
+                )
+    return out
+
+
+async def read_upload(
+    file: UploadFile, max_statements: int, max_archive_bytes: int
+) -> tuple[list[tuple[str, str]], bool]:
+    """
+    Запросы из загруженного .sql (все операторы, не только первый) или
+    .zip с .sql-файлами: [(имя файла, SQL)], и признак архива. ZIP читается
+    с диска по месту (Starlette уже сбросил тело запроса во временный файл);
+    max_archive_bytes ограничивает и сам архив, и сумму распакованных .sql.
+    """
+    filename = file.filename or ""
+    lower = filename.lower()
+    if lower.endswith(".zip"):
+        statements = await asyncio.to_thread(
+            _zip_statements, file.file, max_statements, SQL_FILE_LIMIT, max_archive_bytes
+        )
+        return statements, True
+    if not lower.endswith(".sql"):
+        raise HTTPException(status_code=400, detail="Ожидается .sql или .zip файл")
+    statements = split_sql(decode_sql(await _read_limited(file, SQL_FILE_LIMIT)))
+    if len(statements) > max_statements:
+        raise HTTPException(
+            status_code=413, detail=f"Больше {max_statements} запросов в одной загрузке"
+        )
+    return [(filename, stmt) for stmt in statements], False
+
+
+def _risk(profile: CostProfile) -> str:
+    # Пороги как у индекса CLI `report`.
+    if profile.est_pages >= 500_000 or profile.est_memory_bytes >= 1_000_000_000:
+        return "HIGH"
+    if profile.est_pages >= 100_000 or profile.est_memory_bytes >= 256_000_000:
+        return "MED"
+    return "LOW"
+
+
+def _index_item(name: str, rel_path: str, sql: str, profile: CostProfile) -> IndexItem:
+    hot = top_hotspots(profile, 1)
+    return IndexItem(
+        title=PurePosixPath(name).name,
+        file=name,
+        report_rel=rel_path,
+        risk=_risk(profile),
+        total_cost=float(profile.total_cost),
+        est_pages=float(profile.est_pages),
+        est_bytes=float(profile.est_bytes),
+        est_memory_bytes=float(profile.est_memory_bytes),
+        warnings=len(profile.warnings or []),
+        excerpt=sql.replace("\n", " ")[:180],
+        top_hotspot=hot[0].label if hot else "",
+        fingerprint=fingerprint(sql),
+        tables=sorted({c.relation for c in profile.node_costs if c.relation}),
+        plan_nodes=sorted({c.label for c in profile.node_costs}),
+    )
+
+
+def _error_item(name: str, sql: str, error: str) -> IndexItem:
+    return IndexItem(
+        title=PurePosixPath(name).name,
+        file=name,
+        report_rel="",
+        risk="ERROR",
+        total_cost=0.0,
+        est_pages=0.0,
+        est_bytes=0.0,
+        warnings=0,
+        excerpt=sql.replace("\n", " ")[:180],
+        error=error,
+    )
+
+
+def _zip_dir(root: str) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for dirpath, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                zf.write(path, os.path.relpath(path, root))
+    return buf.getvalue()
+
+
+async def build_batch_report(
+    engine: Engine,
+    statements: list[tuple[str, str]],
+    label: str,
+    *,
+    n_variants: int,
+    refresh: bool,
+    measure_latency: bool = False,
+    concurrency: int = 4,
+    title: Optional[str] = None,
+) -> bytes:
+    """
+    ZIP в раскладке CLI `report`: index.html, reports/ab/<hash>.html, assets/.
+    Запросы разбираются параллельно (не больше concurrency) через общие
+    пул соединений, executor EXPLAIN, HTTP-клиент и кэш LLM. Ошибка одного
+    запроса не валит пакет — он попадает в индекс со статусом ERROR.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+    with tempfile.TemporaryDirectory(prefix="pgqg-batch-") as tmp:
+        store = ReportStore(tmp, write_report_assets(tmp))
+
+        async def analyse(name: str, sql: str) -> IndexItem:
+            async with sem:
+                try:
+                    with stage("catalog"):
+                        mem = await memory_settings(engine)
+                    with stage("explain"):
+                        plan = await explain(engine, sql)
+                    profile = estimate_profile(plan, settings=mem)
+                except Exception as e:
+                    return _error_item(name, sql, f"EXPLAIN/estimate ошибка: {e}")
+                llm_error = None
+                try:
+                    variants = await improve_and_filter_sql(
+                        engine,
+                        sql,
+                        profile=profile,
+                        n_variants=n_variants,
+                        dialect="PostgreSQL 15",
+                        refresh_cache=refresh,
+                        mem_settings=mem,
+                        measure_latency=measure_latency,
+                    )
+                except Exception as e:
+                    # Отчёт по плану полезен и без AI-вариантов; ошибка — в manifest.json.
+                    variants, llm_error = [], f"LLM pipeline ошибка: {e}"
+                with stage("render"):
+                    rel_path = await asyncio.to_thread(
+                        store.put, plan, profile, [], sql, label, variants
+                    )
+                item = _index_item(name, rel_path, sql, profile)
+                item.error = llm_error
+                return item
+
+        items = await asyncio.gather(*(analyse(name, sql) for name, sql in statements))
+        await asyncio.to_thread(
+            write_index_page, tmp, items, title or "SQL Advisor — отчёты"
+        )
+        return await asyncio.to_thread(_zip_dir, tmp)
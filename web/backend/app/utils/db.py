@@ -0,0 +1,200 @@
+import asyncio
+import functools
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, TypeVar
+
+from pgqueryguard.outer_database.count_resourses import MemorySettings
+from pgqueryguard.outer_database.inspect import read_memory_settings, run_explain
+from sqlalchemy import Engine, create_engine
+
+from app.config import get_settings
+from app.metrics import track_engine
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Entry:
+    engine: Engine
+    last_used: float
+    memory: MemorySettings | None = None
+    # Сколько работ сейчас держат движок (lease); такой движок не закрывается.
+    leases: int = 0
+
+
+class EngineRegistry:
+    """
+    Один Engine (и его пул соединений) на нормализованный DSN на процесс.
+    Лишние по LRU и простаивающие дольше idle_timeout движки закрываются,
+    но только когда их никто не держит через lease(): закрытый на ходу
+    движок SQLAlchemy тихо создал бы новый пул мимо реестра.
+    """
+
+    def __init__(
+        self,
+        max_engines: int = 16,
+        idle_timeout: float = 300.0,
+        pool_size: int = 2,
+        max_overflow: int = 2,
+        pool_timeout: float = 10.0,
+    ):
+        self.max_engines = max_engines
+        self.idle_timeout = idle_timeout
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_timeout = pool_timeout
+        self._engines: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lease(self, dsn: str) -> Iterator[Engine]:
+        """
+        with registry.lease(dsn) as engine: ... — движок на время работы.
+        Простой считается с момента, когда отпущен последний lease.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._engines.get(dsn)
+            if entry is not None:
+                self._engines.move_to_end(dsn)
+            else:
+                engine = create_engine(
+                    dsn,
+                    pool_pre_ping=True,
+                    pool_size=self.pool_size,
+                    max_overflow=self.max_overflow,
+                    pool_timeout=self.pool_timeout,
+                )
+                entry = _Entry(engine=track_engine(engine), last_used=now)
+                self._engines[dsn] = entry
+            entry.leases += 1
+            entry.last_used = now
+            evicted = self._evict(now)
+        self._dispose(evicted)
+        try:
+            yield entry.engine
+        finally:
+            now = time.monotonic()
+            with self._lock:
+                entry.leases -= 1
+                entry.last_used = now
+                evicted = self._evict(now)
+            self._dispose(evicted)
+
+    def memory_settings(self, engine: Engine) -> MemorySettings:
+        """
+        work_mem и hash_mem_multiplier сервера: читаются из pg_settings один
+        раз на движок и живут, пока движок в реестре. Блокирующий вызов.
+        """
+        with self._lock:
+            entry = next((e for e in self._engines.values() if e.engine is engine), None)
+            if entry is not None and entry.memory is not None:
+                return entry.memory
+        settings = read_memory_settings(engine)
+        if entry is not None:
+            entry.memory = settings
+        return settings
+
+    def prune(self) -> int:
+        """Закрывает простаивающие движки; зовётся фоновой задачей."""
+        with self._lock:
+            evicted = self._evict(time.monotonic())
+        self._dispose(evicted)
+        return len(evicted)
+
+    def dispose_all(self) -> None:
+        with self._lock:
+            evicted = [e.engine for e in self._engines.values()]
+            self._engines.clear()
+        self._dispose(evicted)
+
+    def __len__(self) -> int:
+        return len(self._engines)
+
+    def _evict(self, now: float) -> list[Engine]:
+        # Занятые движки не трогаем: при нехватке мест реестр временно
+        # держит больше max_engines, лишние уйдут по мере освобождения.
+        free = [dsn for dsn, e in self._engines.items() if not e.leases]
+        stale = [dsn for dsn in free if now - self._engines[dsn].last_used > self.idle_timeout]
+        evicted = [self._engines.pop(dsn).engine for dsn in stale]
+        for dsn in free:
+            if len(self._engines) <= self.max_engines:
+                break
+            if dsn in self._engines:
+                evicted.append(self._engines.pop(dsn).engine)
+        return evicted
+
+    @staticmethod
+    def _dispose(engines: list[Engine]) -> None:
+        # Вне блокировки: закрытие соединений может ждать сеть.
+        for engine in engines:
+            engine.dispose()
+
+
+registry: EngineRegistry | None = None
+
+
+def get_engine_registry() -> EngineRegistry:
+    global registry
+    if registry is None:
+        s = get_settings()
+        registry = EngineRegistry(
+            max_engines=s.DB_ENGINE_CACHE_SIZE,
+            idle_timeout=s.DB_ENGINE_IDLE_TIMEOUT,
+            pool_size=s.DB_POOL_SIZE,
+            max_overflow=s.DB_MAX_OVERFLOW,
+            pool_timeout=s.DB_POOL_TIMEOUT,
+        )
+    return registry
+
+
+# Синхронный драйвер работает в ограниченном пуле потоков, чтобы долгий
+# EXPLAIN не останавливал event loop (и /health) для остальных запросов.
+_executor: ThreadPoolExecutor | None = None
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=get_settings().DB_WORKERS, thread_name_prefix="db"
+        )
+    return _executor
+
+
+def shutdown_db_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_db(fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    loop = asyncio.get_running_loop()
+    call = functools.partial(fn, *args, **kwargs)
+    return await loop.run_in_executor(get_db_executor(), call)
+
+
+async def memory_settings(engine: Engine) -> MemorySettings:
+    return await run_db(get_engine_registry().memory_settings, engine)
+
+
+async def explain(
+    engine: Engine, sql: str, timeout: float | None = None
+) -> dict[str, Any]:
+    """
+    С timeout запрос ограничен на сервере (statement_timeout), а вызывающий
+    получает TimeoutError не позже timeout. Поток пула wait_for не прерывает:
+    он занят, пока сервер не отменит запрос или не ответит (при потере связи
+    с БД — до сетевого таймаута драйвера).
+    """
+    if timeout is None:
+        return await run_db(run_explain, engine, sql)
+    call = run_db(run_explain, engine, sql, timeout_ms=int(timeout * 1000))
+    return await asyncio.wait_for(call, timeout)
@@ -0,0 +1,235 @@
+import asyncio
+import contextlib
+import sqlite3
+import time
+import uuid
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import HTTPException
+
+from app.config import get_settings
+from app.metrics import REPORT_JOBS
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+@dataclass
+class Job:
+    id: str
+    key: str
+    status: str
+    created: float
+    updated: float
+    error: Optional[str] = None
+    # HTTP-статус ошибки: detail из HTTPException или 500 для прочих исключений.
+    error_code: Optional[int] = None
+
+
+class JobStore:
+    """
+    Статусы и результаты (HTML-отчёт или ZIP пакета) в SQLite. Вход задачи (DSN с паролем,
+    SQL) на диск не пишется: после рестарта незавершённые задачи
+    помечаются упавшими, а не перезапускаются.
+    """
+
+    _COLUMNS = "id, key, status, created, updated, error, error_code"
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS report_jobs ("
+                "id TEXT PRIMARY KEY, key TEXT NOT NULL, status TEXT NOT NULL, "
+                "created REAL NOT NULL, updated REAL NOT NULL, "
+                "error TEXT, result BLOB, error_code INTEGER)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(report_jobs)")}
+            if "error_code" not in columns:
+                # Файл от прошлой версии сервиса.
+                conn.execute("ALTER TABLE report_jobs ADD COLUMN error_code INTEGER")
+            conn.execute("CREATE INDEX IF NOT EXISTS report_jobs_key ON report_jobs (key)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # Соединение на операцию: вызовы идут из разных потоков asyncio.to_thread.
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    def add(self, job: Job) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO report_jobs ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job.id, job.key, job.status, job.created, job.updated,
+                    job.error, job.error_code,
+                ),
+            )
+            conn.execute("DELETE FROM report_jobs WHERE updated < ?", (job.created - self.ttl,))
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {self._COLUMNS} FROM report_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return Job(*row) if row else None
+
+    def result(self, job_id: str) -> Optional[str | bytes]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT result FROM report_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def update(
+        self,
+        job_id: str,
+        status: str,
+        error: Optional[str] = None,
+        result: Optional[str | bytes] = None,
+        error_code: Optional[int] = None,
+    ) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE report_jobs SET status = ?, updated = ?, error = ?, result = ?, "
+                "error_code = ? WHERE id = ?",
+                (status, time.time(), error, result, error_code, job_id),
+            )
+
+    def fail_unfinished(self) -> int:
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE report_jobs SET status = ?, updated = ?, error = ?, error_code = ? "
+                "WHERE status IN (?, ?)",
+                (FAILED, time.time(), "Прервано перезапуском сервиса", 500, QUEUED, RUNNING),
+            )
+            return cur.rowcount
+
+
+class JobQueue:
+    """
+    Фоновая генерация отчётов: workers задач на процесс, не больше
+    per_dsn одновременно на одну БД. Задача живёт независимо от HTTP-запроса,
+    одинаковые ещё не завершённые задачи (тот же key) не дублируются.
+    Слот DSN задача получает до очереди воркеров: задачи сверх per_dsn ждут
+    в очереди своего DSN и не занимают воркеров, нужных другим базам.
+    """
+
+    def __init__(self, store: JobStore, workers: int = 4, per_dsn: int = 2):
+        self.store = store
+        self.workers = workers
+        self.per_dsn = per_dsn
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._pending: dict[str, Job] = {}
+        self._running: dict[str, int] = {}
+        self._waiting: dict[str, deque] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        # Очередь привязана к event loop — новая на каждый запуск.
+        self._queue = asyncio.Queue()
+        self._pending = {}
+        self._running = {}
+        self._waiting = {}
+        await asyncio.to_thread(self.store.fail_unfinished)
+        REPORT_JOBS.labels(QUEUED).set(0)
+        REPORT_JOBS.labels(RUNNING).set(0)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+
+    async def submit(
+        self, key: str, dsn: str, run: Callable[[], Awaitable[str | bytes]]
+    ) -> Job:
+        # Решение о дубликате — только по памяти: до записи в SQLite
+        # параллельный submit получит этот же объект задачи.
+        job = self._pending.get(key)
+        if job is not None:
+            return job
+        now = time.time()
+        job = Job(id=uuid.uuid4().hex, key=key, status=QUEUED, created=now, updated=now)
+        self._pending[key] = job
+        try:
+            await asyncio.to_thread(self.store.add, job)
+        except BaseException:
+            self._pending.pop(key, None)
+            raise
+        REPORT_JOBS.labels(QUEUED).inc()
+        if self._running.get(dsn, 0) < self.per_dsn:
+            self._running[dsn] = self._running.get(dsn, 0) + 1
+            self._queue.put_nowait((job, dsn, run))
+        else:
+            self._waiting.setdefault(dsn, deque()).append((job, dsn, run))
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def result(self, job_id: str) -> Optional[str | bytes]:
+        return await asyncio.to_thread(self.store.result, job_id)
+
+    def _release(self, dsn: str) -> None:
+        # Слот DSN переходит следующей ждущей задаче этой же базы.
+        waiting = self._waiting.get(dsn)
+        if waiting:
+            self._queue.put_nowait(waiting.popleft())
+            if not waiting:
+                del self._waiting[dsn]
+            return
+        self._running[dsn] -= 1
+        if not self._running[dsn]:
+            del self._running[dsn]
+
+    async def _worker(self) -> None:
+        while True:
+            job, dsn, run = await self._queue.get()
+            try:
+                await self._run(job, run)
+            finally:
+                self._release(dsn)
+                self._queue.task_done()
+
+    async def _run(self, job: Job, run: Callable[[], Awaitable[str | bytes]]) -> None:
+        REPORT_JOBS.labels(QUEUED).dec()
+        REPORT_JOBS.labels(RUNNING).inc()
+        try:
+            job.status = RUNNING
+            await asyncio.to_thread(self.store.update, job.id, RUNNING)
+            try:
+                result = await run()
+            except HTTPException as e:
+                job.status, job.error, job.error_code = FAILED, str(e.detail), e.status_code
+            except Exception as e:
+                job.status, job.error, job.error_code = FAILED, str(e), 500
+            else:
+                job.status = DONE
+                await asyncio.to_thread(self.store.update, job.id, DONE, None, result)
+                return
+            await asyncio.to_thread(
+                self.store.update, job.id, FAILED, job.error, None, job.error_code
+            )
+        finally:
+            REPORT_JOBS.labels(RUNNING).dec()
+            self._pending.pop(job.key, None)
+
+
+_jobs: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    global _jobs
+    if _jobs is None:
+        s = get_settings()
+        _jobs = JobQueue(
+            JobStore(s.REPORT_JOBS_PATH, s.REPORT_JOBS_TTL),
+            workers=s.REPORT_JOBS_WORKERS,
+            per_dsn=s.REPORT_JOBS_PER_DSN,
+        )
+    return _jobs
@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from pgqueryguard.checkers.fingerprint import fingerprint
+
+from app.config import get_settings
+from app.metrics import LLM_CACHE_REQUESTS
+
+Candidates = List[Dict[str, Any]]
+
+
+def cache_key(sql: str, **params: Any) -> str:
+    """
+    Ключ по нормализованному SQL (форматирование и комментарии не важны,
+    константы — важны: они попадают в переписанный запрос) и параметрам
+    генерации: провайдер, модель, число вариантов, температура, версия промпта.
+    """
+    payload = {"sql": fingerprint(sql, keep_literals=True), **params}
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Два уровня: LRU в памяти процесса и (если задан path) SQLite на диске,
+    переживающий рестарты. Записи старше ttl секунд считаются промахом.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 7 * 24 * 3600, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._memory: OrderedDict[str, tuple[float, Candidates]] = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    "key TEXT PRIMARY KEY, created REAL NOT NULL, value TEXT NOT NULL)"
+                )
+
+    async def get(self, key: str) -> Optional[Candidates]:
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit and now - hit[0] <= self.ttl:
+                self._memory.move_to_end(key)
+                LLM_CACHE_REQUESTS.labels("memory_hit").inc()
+                return hit[1]
+            if hit:
+                del self._memory[key]
+        if self.path:
+            row = await asyncio.to_thread(self._disk_get, key, now)
+            if row is not None:
+                self._remember(key, *row)
+                LLM_CACHE_REQUESTS.labels("disk_hit").inc()
+                return row[1]
+        LLM_CACHE_REQUESTS.labels("miss").inc()
+        return None
+
+    async def set(self, key: str, value: Candidates) -> None:
+        created = time.time()
+        self._remember(key, created, value)
+        if self.path:
+            await asyncio.to_thread(self._disk_set, key, created, value)
+
+    def _remember(self, key: str, created: float, value: Candidates) -> None:
+        with self._lock:
+            self._memory[key] = (created, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Соединение на операцию: sqlite3 привязывает соединение к потоку.
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    def _disk_get(self, key: str, now: float) -> Optional[tuple[float, Candidates]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT created, value FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[0] > self.ttl:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+        return row[0], json.loads(row[1])
+
+    def _disk_set(self, key: str, created: float, value: Candidates) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, created, value) VALUES (?, ?, ?)",
+                (key, created, json.dumps(value, ensure_ascii=False)),
+            )
+            conn.execute("DELETE FROM llm_cache WHERE created < ?", (created - self.ttl,))
+
+
+_cache: Optional[LLMCache] = None
+
+
+def get_llm_cache() -> LLMCache:
+    global _cache
+    if _cache is None:
+        s = get_settings()
+        _cache = LLMCache(
+            max_entries=s.LLM_CACHE_SIZE,
+            ttl=s.LLM_CACHE_TTL,
+            path=s.LLM_CACHE_PATH,
+        )
+    return _cache
@@ -0,0 +1,74 @@
+from collections.abc import Iterable
+
+import sqlglot
+from pgqueryguard.checkers.fingerprint import fingerprint
+from pgqueryguard.checkers.references import referenced_tables, unknown_references
+from pgqueryguard.checkers.validator import validate_query
+from pgqueryguard.outer_database.inspect import read_columns
+from sqlalchemy import Engine
+
+from app.metrics import LLM_CANDIDATES
+from app.utils.db import run_db
+
+
+class CandidateFilter:
+    """
+    Локальные проверки кандидата до EXPLAIN: ровно один оператор, который
+    разбирает sqlglot (validate_query); AST-отпечаток с константами не
+    совпадает ни с исходным запросом, ни с уже принятым кандидатом; все
+    таблицы и столбцы есть в снимке схемы. До БД доходят только различные
+    и правдоподобные варианты.
+    """
+
+    def __init__(self, engine: Engine, baseline_sql: str):
+        self.engine = engine
+        self._baseline = fingerprint(baseline_sql, keep_literals=True)
+        self._seen: set[str] = set()
+        self._columns: dict[str, set[str]] = {}
+        self._looked_up: set[str] = set()
+        self._schema_ok = True
+
+    async def load_schema(self, sqls: Iterable[str]) -> None:
+        """Один запрос к каталогу на все таблицы, которых ещё нет в снимке."""
+        missing: set[str] = set()
+        for sql in sqls:
+            missing |= referenced_tables(sql)
+        missing -= self._looked_up
+        if not missing or not self._schema_ok:
+            return
+        try:
+            found = await run_db(read_columns, self.engine, missing)
+        except Exception:
+            # Без снимка схемы эту проверку пропускаем — её сделает EXPLAIN.
+            self._schema_ok = False
+            return
+        self._looked_up |= missing
+        for table, cols in found.items():
+            self._columns.setdefault(table, set()).update(cols)
+
+    async def accept(self, csql: str) -> bool:
+        reason = await self._reject_reason(csql)
+        LLM_CANDIDATES.labels(reason or "accepted").inc()
+        return reason is None
+
+    async def _reject_reason(self, csql: str) -> str | None:
+        if validate_query(csql):
+            return "invalid"
+        try:
+            statements = [s for s in sqlglot.parse(csql, read="postgres") if s]
+        except sqlglot.ParseError:
+            return "invalid"
+        if len(statements) != 1:
+            return "invalid"
+
+        fp = fingerprint(csql, keep_literals=True)
+        if fp == self._baseline:
+            return "same_as_baseline"
+        if fp in self._seen:
+            return "duplicate"
+        self._seen.add(fp)
+
+        await self.load_schema([csql])
+        if self._schema_ok and unknown_references(csql, self._columns):
+            return "unknown_schema"
+        return None
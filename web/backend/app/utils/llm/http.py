@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from app.config import get_settings
+from app.metrics import LLM_RETRIES
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def retry_after_seconds(resp: httpx.Response) -> Optional[float]:
+    """Retry-After бывает числом секунд или HTTP-датой."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMHttp:
+    """
+    Долгоживущий httpx.AsyncClient на провайдера (keep-alive, HTTP/2),
+    повторы на 429/5xx и сетевых ошибках с экспоненциальной задержкой и
+    jitter, уважение Retry-After и single-flight: одинаковые одновременные
+    запросы делят один вызов API.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 10.0,
+        max_connections: int = 20,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections
+        )
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def client(self, provider: str) -> httpx.AsyncClient:
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(http2=True, limits=self.limits)
+            self._clients[provider] = client
+        return client
+
+    async def post_json(
+        self,
+        provider: str,
+        url: str,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        timeout: float,
+    ) -> httpx.Response:
+        raw = json.dumps([provider, url, payload], sort_keys=True, default=str)
+        key = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._post_with_retries(provider, url, headers, payload, timeout)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: отмена одного ожидающего не отменяет общий запрос.
+        return await asyncio.shield(task)
+
+    async def _post_with_retries(
+        self,
+        provider: str,
+        url: str,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        timeout: float,
+    ) -> httpx.Response:
+        client = self.client(provider)
+        attempt = 0
+        while True:
+            try:
+                resp = await client.post(url, headers=headers, json=payload, timeout=timeout)
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                delay = self._retry_delay(resp, attempt)
+                if delay is None:
+                    return resp
+            attempt += 1
+            LLM_RETRIES.labels(provider).inc()
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        provider: str,
+        url: str,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        timeout: float,
+    ) -> AsyncIterator[httpx.Response]:
+        """
+        Потоковый POST (SSE провайдера). Повторы — только пока тело ответа
+        не начали читать; single-flight здесь нет.
+        """
+        client = self.client(provider)
+        attempt = 0
+        while True:
+            request = client.build_request(
+                "POST", url, headers=headers, json=payload, timeout=timeout
+            )
+            try:
+                resp = await client.send(request, stream=True)
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                delay = self._retry_delay(resp, attempt)
+                if delay is None:
+                    try:
+                        yield resp
+                    finally:
+                        await resp.aclose()
+                    return
+                await resp.aclose()
+            attempt += 1
+            LLM_RETRIES.labels(provider).inc()
+            await asyncio.sleep(delay)
+
+    def _retry_delay(self, resp: httpx.Response, attempt: int) -> Optional[float]:
+        """None — ответ окончательный, иначе пауза перед следующей попыткой."""
+        if resp.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+            return None
+        delay = retry_after_seconds(resp)
+        if delay is None:
+            delay = self._backoff(attempt)
+        # Неразумно долгий Retry-After не должен подвешивать запрос.
+        return min(delay, self.backoff_max * 4)
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": равномерно от 0 до экспоненциального потолка.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    async def aclose(self) -> None:
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
+
+
+_http: Optional[LLMHttp] = None
+
+
+def get_llm_http() -> LLMHttp:
+    global _http
+    if _http is None:
+        s = get_settings()
+        _http = LLMHttp(
+            max_retries=s.LLM_MAX_RETRIES,
+            backoff_base=s.LLM_BACKOFF_BASE,
+            backoff_max=s.LLM_BACKOFF_MAX,
+            max_connections=s.LLM_MAX_CONNECTIONS,
+        )
+    return _http
@@ -1,15 +1,27 @@
 import os
 import json
 import asyncio
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 import httpx
 import math
 from sqlalchemy import Engine
 import sys
+import weakref
 
 
-from pgqueryguard.outer_database.count_resourses import CostProfile, estimate_profile
-from pgqueryguard.outer_database.inspect import run_explain
+from pgqueryguard.outer_database.bench import BenchResult, run_benchmark
+from pgqueryguard.outer_database.count_resourses import (
+    CostProfile,
+    MemorySettings,
+    estimate_profile,
+)
+from app.config import get_settings
+from app.metrics import LLM_ERRORS, stage
+from app.utils.llm.cache import cache_key, get_llm_cache
+from app.utils.llm.candidates import CandidateFilter
+from app.utils.llm.http import get_llm_http
+from app.utils.llm.stream import CandidateStream, sse_delta
+from app.utils.db import explain, run_db
 from app.utils.llm.api_utils import (
     get_api_key, 
     get_api_url,
@@ -19,32 +31,25 @@ from app.utils.llm.api_utils import (
 )
 
 
+# Меняется вместе с текстом промпта: старые ответы кэша перестают совпадать.
+PROMPT_VERSION = "1"
+
+
 class SqlImproveError(Exception):
     pass
 
 
-async def improve_sql(
+def _prepare_request(
     sql: str,
     *,
-    llm: str = "openai",
-    n_variants: int = 3,
-    dialect: str = "generic (closest to PostgreSQL)",
-    temperature: float = 0.7,
-    timeout: float = 60.0,
-    extra_headers: Optional[Dict[str, str]] = None,
-    extra_payload: Optional[Dict[str, Any]] = None,
-) -> List[Dict[str, Any]]:
-    """
-    Асинхронно улучшает SQL-запрос через совместимый с OpenAI Chat Completions API.
-
-    Возвращает список объектов-кандидатов:
-      [{sql, explanation, changes, semantics, assumptions, tags}, ...]
-
-    :param api_url: полный URL до Chat Completions совместимого провайдера
-    :param api_key: ключ; по умолчанию берётся из окружения OPENAI_API_KEY
-    :param extra_headers: доп. заголовки HTTP (например, {"HTTP-Referer": "..."} )
-    :param extra_payload: доп. поля в тело запроса JSON (например, {"top_p": 0.9})
-    """
+    llm: str,
+    n_variants: int,
+    dialect: str,
+    temperature: float,
+    extra_headers: Optional[Dict[str, str]],
+    extra_payload: Optional[Dict[str, Any]],
+) -> Tuple[str, Dict[str, str], Dict[str, Any], str]:
+    """URL, заголовки, тело запроса к LLM и ключ кэша."""
     if not sql or not sql.strip():
         raise SqlImproveError("Пустой SQL на входе.")
 
@@ -97,6 +102,17 @@ async def improve_sql(
         # Позволяет добавлять совместимые с эндпоинтом поля (top_p, seed, stop и т.п.)
         payload.update(extra_payload)
 
+    key = cache_key(
+        sql,
+        llm=llm,
+        model=payload["model"],
+        n_variants=n_variants,
+        temperature=payload.get("temperature"),
+        dialect=dialect,
+        prompt_version=PROMPT_VERSION,
+        extra_payload=extra_payload,
+    )
+
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json",
@@ -104,64 +120,107 @@ async def improve_sql(
     if extra_headers:
         headers.update(extra_headers)
 
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        try:
-            resp = await client.post(api_url, headers=headers, json=payload)
-        except httpx.RequestError as e:
-            raise SqlImproveError(f"HTTP ошибка: {e}") from e
+    return api_url, headers, payload, key
+
+
+async def improve_sql(
+    sql: str,
+    *,
+    llm: str = "openai",
+    n_variants: int = 3,
+    dialect: str = "generic (closest to PostgreSQL)",
+    temperature: float = 0.7,
+    timeout: float = 60.0,
+    extra_headers: Optional[Dict[str, str]] = None,
+    extra_payload: Optional[Dict[str, Any]] = None,
+    refresh_cache: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Асинхронно улучшает SQL-запрос через совместимый с OpenAI Chat Completions API.
+    Ответы кэшируются (см. app.utils.llm.cache); refresh_cache=True игнорирует
+    сохранённый ответ и перезаписывает его новым.
+
+    Возвращает список объектов-кандидатов:
+      [{sql, explanation, changes, semantics, assumptions, tags}, ...]
+
+    :param api_url: полный URL до Chat Completions совместимого провайдера
+    :param api_key: ключ; по умолчанию берётся из окружения OPENAI_API_KEY
+    :param extra_headers: доп. заголовки HTTP (например, {"HTTP-Referer": "..."} )
+    :param extra_payload: доп. поля в тело запроса JSON (например, {"top_p": 0.9})
+    """
+    api_url, headers, payload, key = _prepare_request(
+        sql,
+        llm=llm,
+        n_variants=n_variants,
+        dialect=dialect,
+        temperature=temperature,
+        extra_headers=extra_headers,
+        extra_payload=extra_payload,
+    )
+    cache = get_llm_cache()
+    if not refresh_cache:
+        cached = await cache.get(key)
+        if cached is not None:
+            return cached
+
+    try:
+        resp = await get_llm_http().post_json(llm, api_url, headers, payload, timeout)
+    except httpx.TimeoutException as e:
+        LLM_ERRORS.labels("timeout").inc()
+        raise SqlImproveError(f"Таймаут LLM API: {e}") from e
+    except httpx.RequestError as e:
+        LLM_ERRORS.labels("http").inc()
+        raise SqlImproveError(f"HTTP ошибка: {e}") from e
 
     if resp.status_code != 200:
+        LLM_ERRORS.labels("api").inc()
         raise SqlImproveError(f"API error {resp.status_code}: {resp.text}")
 
     try:
         data = resp.json()
     except json.JSONDecodeError as e:
+        LLM_ERRORS.labels("invalid_response").inc()
         raise SqlImproveError(f"Некорректный JSON от API: {resp.text[:500]}...") from e
 
     try:
         content = data["choices"][0]["message"]["content"]
     except (KeyError, IndexError) as e:
+        LLM_ERRORS.labels("invalid_response").inc()
         raise SqlImproveError(f"Неожиданная форма ответа API: {data}") from e
 
     try:
         parsed = json.loads(content)
     except json.JSONDecodeError as e:
+        LLM_ERRORS.labels("invalid_response").inc()
         raise SqlImproveError(f"Модель вернула невалидный JSON: {content[:500]}...") from e
 
     candidates = parsed.get("candidates")
     if not isinstance(candidates, list) or not candidates:
+        LLM_ERRORS.labels("invalid_response").inc()
         raise SqlImproveError(f"В ответе нет candidates: {parsed}")
 
+    await cache.set(key, candidates)
     return candidates
 
 
-async def improve_and_filter_sql(
-    engine: Engine,
-    baseline_sql: str,
+async def stream_improve_sql(
+    sql: str,
     *,
-    profile: CostProfile,
     llm: str = "openai",
     n_variants: int = 3,
-    dialect: str = "PostgreSQL 15",
+    dialect: str = "generic (closest to PostgreSQL)",
     temperature: float = 0.7,
+    timeout: float = 60.0,
     extra_headers: Optional[Dict[str, str]] = None,
     extra_payload: Optional[Dict[str, Any]] = None,
-    # оценки/пороги:
-    work_mem_bytes: int = 64 * 1024 * 1024,
-    min_cost_improvement: float = 0.10,      # ≥10% по Total Cost
-    min_weighted_improvement: float = 0.15,  # ≥15% по взвешенной геометрии
-    warn_relax_cost_drop: float = 0.20,      # если варнингов стало больше — требуем ≥20% по cost
-    weights: Optional[Dict[str, float]] = None,  # веса метрик для геометрии
-    # Поведение:
-    require_preserved_semantics: bool = True,
-) -> Dict[str, Any]:
+    refresh_cache: bool = False,
+) -> AsyncIterator[Dict[str, Any]]:
     """
-    Возвращает: список объектов-кандидатов ровно в том же формате, что и improve_sql,
-    но отфильтрованный по EXPLAIN (без ANALYZE).
+    Как improve_sql, но отдаёт кандидатов по одному, пока модель ещё пишет
+    ответ (stream=True у провайдера). Полный список попадает в тот же кэш.
     """
-
-    candidates = await improve_sql(
-        baseline_sql,
+    api_url, headers, payload, key = _prepare_request(
+        sql,
         llm=llm,
         n_variants=n_variants,
         dialect=dialect,
@@ -169,7 +228,86 @@ async def improve_and_filter_sql(
         extra_headers=extra_headers,
         extra_payload=extra_payload,
     )
+    cache = get_llm_cache()
+    if not refresh_cache:
+        cached = await cache.get(key)
+        if cached is not None:
+            for cand in cached:
+                yield cand
+            return
+
+    parser = CandidateStream()
+    candidates: List[Dict[str, Any]] = []
+    try:
+        async with get_llm_http().stream(
+            llm, api_url, headers, {**payload, "stream": True}, timeout
+        ) as resp:
+            if resp.status_code != 200:
+                LLM_ERRORS.labels("api").inc()
+                body = (await resp.aread()).decode("utf-8", errors="replace")
+                raise SqlImproveError(f"API error {resp.status_code}: {body}")
+            async for line in resp.aiter_lines():
+                delta = sse_delta(line)
+                if not delta:
+                    continue
+                for cand in parser.feed(delta):
+                    candidates.append(cand)
+                    yield cand
+    except httpx.TimeoutException as e:
+        LLM_ERRORS.labels("timeout").inc()
+        raise SqlImproveError(f"Таймаут LLM API: {e}") from e
+    except httpx.RequestError as e:
+        LLM_ERRORS.labels("http").inc()
+        raise SqlImproveError(f"HTTP ошибка: {e}") from e
+
+    if not candidates:
+        LLM_ERRORS.labels("invalid_response").inc()
+        raise SqlImproveError("В потоке ответа нет candidates")
+
+    await cache.set(key, candidates)
+
+
+def _prefilter(cand: Dict[str, Any], require_preserved_semantics: bool) -> Optional[str]:
+    """SQL кандидата, если его стоит EXPLAIN-ить, иначе None."""
+    csql = (cand.get("sql") or "").strip()
+    semantics = (cand.get("semantics") or "").strip().lower()
+
+    if not csql:
+        return None
+    if require_preserved_semantics and semantics and semantics != "preserved":
+        return None
+    return csql
+
+
+async def _profile_candidate(
+    engine: Engine,
+    csql: str,
+    sem: asyncio.Semaphore,
+    explain_timeout: float,
+    work_mem_bytes: int,
+    mem_settings: Optional[MemorySettings] = None,
+) -> Optional[CostProfile]:
+    # Ошибка или таймаут одного кандидата не задерживает остальных.
+    async with sem:
+        try:
+            with stage("candidate_explain"):
+                c_plan = await explain(engine, csql, timeout=explain_timeout)
+            return estimate_profile(c_plan, work_mem_bytes, mem_settings)
+        except Exception:
+            return None
+
 
+def _score_candidate(
+    cand: Dict[str, Any],
+    c_prof: CostProfile,
+    profile: CostProfile,
+    *,
+    min_cost_improvement: float,
+    min_weighted_improvement: float,
+    warn_relax_cost_drop: float,
+    weights: Optional[Dict[str, float]],
+) -> Optional[Dict[str, Any]]:
+    """Кандидат с метриками, если он заметно лучше исходного запроса, иначе None."""
     base_cost = float(getattr(profile, "total_cost", 0.0))
     base_pages = float(getattr(profile, "est_pages", 0.0))
     base_mem = float(getattr(profile, "est_memory_bytes", 0.0))
@@ -179,62 +317,278 @@ async def improve_and_filter_sql(
     weights = weights or {"cost": 0.6, "pages": 0.2, "memory": 0.15, "rows": 0.05}
     threshold_ratio = 1.0 - float(min_weighted_improvement)
 
-    shortlisted: List[Dict[str, Any]] = []
+    c_cost = float(getattr(c_prof, "total_cost", 0.0))
+    c_pages = float(getattr(c_prof, "est_pages", 0.0))
+    c_mem = float(getattr(c_prof, "est_memory_bytes", 0.0))
+    c_rows = float(getattr(c_prof, "est_rows", 0.0))
+    c_warnings = len(getattr(c_prof, "warnings", []) or [])
+
+    ratios = {
+        "cost": _safe_ratio(c_cost, base_cost),
+        "pages": _safe_ratio(c_pages, base_pages),
+        "memory": _safe_ratio(c_mem, base_mem),
+        "rows": _safe_ratio(c_rows, base_rows),
+    }
+    geom_ratio = _weighted_geom_ratio(ratios, weights)
+
+    cost_better = (base_cost > 0) and ((base_cost - c_cost) / base_cost >= min_cost_improvement)
+    weighted_better = geom_ratio <= threshold_ratio
+
+    if c_warnings > base_warnings and not ((base_cost - c_cost) / base_cost >= warn_relax_cost_drop):
+        return None
+
+    if not (cost_better or weighted_better):
+        return None
+
+    out_cand = dict(cand)
+    out_cand.update(
+        {
+            "c_cost": c_cost,
+            "c_pages": c_pages,
+            "c_mem": c_mem,
+            "c_rows": c_rows,
+            "c_warnings": c_warnings,
+            "improvement": {
+                "cost_pct": _impr_pct(base_cost, c_cost),
+                "pages_pct": _impr_pct(base_pages, c_pages),
+                "memory_pct": _impr_pct(base_mem, c_mem),
+                "rows_pct": _impr_pct(base_rows, c_rows),
+                "warnings_diff": base_warnings - c_warnings,  # >0 = меньше предупреждений
+                "weighted_geom_ratio": geom_ratio,            # <1.0 = лучше
+            },
+        }
+    )
+    return out_cand
 
-    for cand in candidates:
-        csql = (cand.get("sql") or "").strip()
-        semantics = (cand.get("semantics") or "").strip().lower()
 
-        if not csql:
-            continue
-        if require_preserved_semantics and semantics and semantics != "preserved":
-            continue
+# Один замер латентности на движок (БД) одновременно; движок ушёл — ушла и блокировка.
+_bench_locks: "weakref.WeakKeyDictionary[Engine, asyncio.Lock]" = weakref.WeakKeyDictionary()
 
-        try:
-            c_plan = run_explain(engine, csql)
-            c_prof = estimate_profile(c_plan, work_mem_bytes)
-        except Exception:
-            continue
 
-        c_cost = float(getattr(c_prof, "total_cost", 0.0))
-        c_pages = float(getattr(c_prof, "est_pages", 0.0))
-        c_mem = float(getattr(c_prof, "est_memory_bytes", 0.0))
-        c_rows = float(getattr(c_prof, "est_rows", 0.0))
-        c_warnings = len(getattr(c_prof, "warnings", []) or [])
-
-        ratios = {
-            "cost": _safe_ratio(c_cost, base_cost),
-            "pages": _safe_ratio(c_pages, base_pages),
-            "memory": _safe_ratio(c_mem, base_mem),
-            "rows": _safe_ratio(c_rows, base_rows),
-        }
-        geom_ratio = _weighted_geom_ratio(ratios, weights)
+def _bench_summary(res: BenchResult) -> Dict[str, Any]:
+    return {
+        "runs": res.runs,
+        "timeouts": res.timeouts,
+        "error": res.error,
+        "p50_ms": res.p50_ms,
+        "p95_ms": res.p95_ms,
+        "p99_ms": res.p99_ms,
+        "rows": res.rows,
+        "shared_hit": res.shared_hit,
+        "shared_read": res.shared_read,
+    }
 
-        cost_better = (base_cost > 0) and ((base_cost - c_cost) / base_cost >= min_cost_improvement)
-        weighted_better = geom_ratio <= threshold_ratio
 
-        if c_warnings > base_warnings and not ((base_cost - c_cost) / base_cost >= warn_relax_cost_drop):
-            continue
+async def _rank_by_latency(
+    engine: Engine, baseline_sql: str, shortlisted: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Замер исходного запроса и кандидатов (BENCH_RUNS раз после BENCH_WARMUP,
+    с BENCH_TIMEOUT на выполнение) и сортировка по медиане. Замеры идут
+    по очереди, чтобы кандидаты не мешали друг другу, — в том числе замеры
+    разных запросов пакета и параллельных отчётов по той же БД (блокировка
+    на движок). Кандидаты с таймаутом или ошибкой — в конце, в исходном порядке.
+    """
+    s = get_settings()
+    timeout_ms = int(s.BENCH_TIMEOUT * 1000)
+
+    async def measure(sql: str) -> BenchResult:
+        return await run_db(
+            run_benchmark, engine, sql, s.BENCH_RUNS, s.BENCH_WARMUP, timeout_ms
+        )
+
+    lock = _bench_locks.setdefault(engine, asyncio.Lock())
+    async with lock:
+        with stage("bench"):
+            base = await measure(baseline_sql)
+            for cand in shortlisted:
+                res = await measure(cand["sql"])
+                cand["bench"] = _bench_summary(res)
+                if base.p50_ms is not None and res.p50_ms is not None:
+                    cand["improvement"]["latency_pct"] = _impr_pct(base.p50_ms, res.p50_ms)
 
-        if cost_better or weighted_better:
-            out_cand = dict(cand)
-            out_cand.update(
-                {
-                    "c_cost": c_cost,
-                    "c_pages": c_pages,
-                    "c_mem": c_mem,
-                    "c_rows": c_rows,
-                    "c_warnings": c_warnings,
-                    "improvement": {
-                        "cost_pct": _impr_pct(base_cost, c_cost),
-                        "pages_pct": _impr_pct(base_pages, c_pages),
-                        "memory_pct": _impr_pct(base_mem, c_mem),
-                        "rows_pct": _impr_pct(base_rows, c_rows),
-                        "warnings_diff": base_warnings - c_warnings,  # >0 = меньше предупреждений
-                        "weighted_geom_ratio": geom_ratio,            # <1.0 = лучше
-                    },
-                }
+    def p50(cand: Dict[str, Any]) -> float:
+        bench = cand["bench"]
+        if bench["error"] or bench["timeouts"] or bench["p50_ms"] is None:
+            return math.inf
+        return bench["p50_ms"]
+
+    return sorted(shortlisted, key=p50)
+
+
+async def improve_and_filter_sql(
+    engine: Engine,
+    baseline_sql: str,
+    *,
+    profile: CostProfile,
+    llm: str = "openai",
+    n_variants: int = 3,
+    dialect: str = "PostgreSQL 15",
+    temperature: float = 0.7,
+    extra_headers: Optional[Dict[str, str]] = None,
+    extra_payload: Optional[Dict[str, Any]] = None,
+    # оценки/пороги:
+    work_mem_bytes: int = 64 * 1024 * 1024,
+    mem_settings: Optional[MemorySettings] = None,  # настройки сервера; иначе work_mem_bytes
+    min_cost_improvement: float = 0.10,      # ≥10% по Total Cost
+    min_weighted_improvement: float = 0.15,  # ≥15% по взвешенной геометрии
+    warn_relax_cost_drop: float = 0.20,      # если варнингов стало больше — требуем ≥20% по cost
+    weights: Optional[Dict[str, float]] = None,  # веса метрик для геометрии
+    # Поведение:
+    require_preserved_semantics: bool = True,
+    explain_concurrency: int = 4,            # одновременных EXPLAIN кандидатов
+    explain_timeout: float = 10.0,           # секунд на EXPLAIN одного кандидата
+    refresh_cache: bool = False,             # перегенерировать, не глядя в кэш LLM
+    measure_latency: bool = False,           # выполнить прошедших фильтр и ранжировать по p50
+) -> Dict[str, Any]:
+    """
+    Возвращает: список объектов-кандидатов ровно в том же формате, что и improve_sql,
+    но отфильтрованный по EXPLAIN (без ANALYZE). С measure_latency прошедшие
+    фильтр кандидаты реально выполняются (EXPLAIN ANALYZE в read-only
+    транзакции) и сортируются по измеренной латентности.
+    """
+
+    with stage("llm"):
+        candidates = await improve_sql(
+            baseline_sql,
+            llm=llm,
+            n_variants=n_variants,
+            dialect=dialect,
+            temperature=temperature,
+            extra_headers=extra_headers,
+            extra_payload=extra_payload,
+            refresh_cache=refresh_cache,
+        )
+
+    prefiltered = []
+    for cand in candidates:
+        csql = _prefilter(cand, require_preserved_semantics)
+        if csql:
+            prefiltered.append((cand, csql))
+
+    # Невалидные, повторы и ссылки мимо схемы отсеиваются без EXPLAIN.
+    local = CandidateFilter(engine, baseline_sql)
+    await local.load_schema([baseline_sql, *(csql for _, csql in prefiltered)])
+    to_check = [(cand, csql) for cand, csql in prefiltered if await local.accept(csql)]
+
+    sem = asyncio.Semaphore(max(1, explain_concurrency))
+    # gather сохраняет порядок кандидатов независимо от порядка завершения.
+    profiles = await asyncio.gather(
+        *(
+            _profile_candidate(
+                engine, csql, sem, explain_timeout, work_mem_bytes, mem_settings
             )
-            shortlisted.append(out_cand)
+            for _, csql in to_check
+        )
+    )
 
-    return shortlisted
\ No newline at end of file
+    shortlisted: List[Dict[str, Any]] = []
+    for (cand, _), c_prof in zip(to_check, profiles):
+        if c_prof is None:
+            continue
+        scored = _score_candidate(
+            cand,
+            c_prof,
+            profile,
+            min_cost_improvement=min_cost_improvement,
+            min_weighted_improvement=min_weighted_improvement,
+            warn_relax_cost_drop=warn_relax_cost_drop,
+            weights=weights,
+        )
+        if scored is not None:
+            shortlisted.append(scored)
+
+    if measure_latency and shortlisted:
+        shortlisted = await _rank_by_latency(engine, baseline_sql, shortlisted)
+    return shortlisted
+
+
+async def stream_improve_and_filter_sql(
+    engine: Engine,
+    baseline_sql: str,
+    *,
+    profile: CostProfile,
+    llm: str = "openai",
+    n_variants: int = 3,
+    dialect: str = "PostgreSQL 15",
+    temperature: float = 0.7,
+    extra_headers: Optional[Dict[str, str]] = None,
+    extra_payload: Optional[Dict[str, Any]] = None,
+    work_mem_bytes: int = 64 * 1024 * 1024,
+    mem_settings: Optional[MemorySettings] = None,
+    min_cost_improvement: float = 0.10,
+    min_weighted_improvement: float = 0.15,
+    warn_relax_cost_drop: float = 0.20,
+    weights: Optional[Dict[str, float]] = None,
+    require_preserved_semantics: bool = True,
+    explain_concurrency: int = 4,
+    explain_timeout: float = 10.0,
+    refresh_cache: bool = False,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Потоковый improve_and_filter_sql с теми же порогами: каждый кандидат
+    уходит на EXPLAIN, как только модель его дописала, и отдаётся сразу
+    после проверки — в порядке готовности, а не в порядке ответа модели.
+    """
+    sem = asyncio.Semaphore(max(1, explain_concurrency))
+    # Готовые кандидаты, исключение генерации или None — конец потока.
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def check(cand: Dict[str, Any], csql: str) -> None:
+        c_prof = await _profile_candidate(
+            engine, csql, sem, explain_timeout, work_mem_bytes, mem_settings
+        )
+        if c_prof is None:
+            return
+        scored = _score_candidate(
+            cand,
+            c_prof,
+            profile,
+            min_cost_improvement=min_cost_improvement,
+            min_weighted_improvement=min_weighted_improvement,
+            warn_relax_cost_drop=warn_relax_cost_drop,
+            weights=weights,
+        )
+        if scored is not None:
+            results.put_nowait(scored)
+
+    local = CandidateFilter(engine, baseline_sql)
+
+    async def produce() -> None:
+        checks: List[asyncio.Task] = []
+        try:
+            await local.load_schema([baseline_sql])
+            with stage("llm"):
+                async for cand in stream_improve_sql(
+                    baseline_sql,
+                    llm=llm,
+                    n_variants=n_variants,
+                    dialect=dialect,
+                    temperature=temperature,
+                    extra_headers=extra_headers,
+                    extra_payload=extra_payload,
+                    refresh_cache=refresh_cache,
+                ):
+                    csql = _prefilter(cand, require_preserved_semantics)
+                    if csql and await local.accept(csql):
+                        checks.append(asyncio.create_task(check(cand, csql)))
+            await asyncio.gather(*checks)
+        except Exception as e:
+            results.put_nowait(e)
+        finally:
+            for task in checks:
+                task.cancel()
+            results.put_nowait(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await results.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Клиент ушёл посреди потока — не тратим LLM и БД впустую.
+        producer.cancel()
@@ -0,0 +1,69 @@
+import json
+from typing import Any, Dict, List, Optional
+
+
+def sse_delta(line: str) -> Optional[str]:
+    """
+    Текст из строки SSE Chat Completions ("data: {...}"). None — строка
+    без текста (комментарий, keep-alive, роль, "[DONE]").
+    """
+    if not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if not data or data == "[DONE]":
+        return None
+    try:
+        return json.loads(data)["choices"][0]["delta"].get("content") or None
+    except (json.JSONDecodeError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+
+class CandidateStream:
+    """
+    Достаёт объекты из {"candidates": [{...}, {...}]} по мере прихода кусков
+    текста: кандидат отдаётся, как только закрылась его фигурная скобка,
+    не дожидаясь конца всего JSON.
+    """
+
+    # Стек скобок, внутри которого начинается объект-кандидат.
+    _CANDIDATE_DEPTH = ["{", "["]
+
+    def __init__(self) -> None:
+        self._text = ""
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._start = -1
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        pos = len(self._text)
+        self._text += chunk
+        for i in range(pos, len(self._text)):
+            ch = self._text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if ch == "{" and self._stack == self._CANDIDATE_DEPTH:
+                    self._start = i
+                self._stack.append(ch)
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if ch == "}" and self._start >= 0 and self._stack == self._CANDIDATE_DEPTH:
+                    try:
+                        obj = json.loads(self._text[self._start : i + 1])
+                    except json.JSONDecodeError:
+                        obj = None
+                    if isinstance(obj, dict):
+                        out.append(obj)
+                    self._start = -1
+        return out
@@ -1,5 +1,5 @@
-import os
 from pathlib import Path
+from typing import Annotated
 
 import sqlparse
 from sqlalchemy import create_engine
@@ -8,13 +8,15 @@ from pgqueryguard.checkers.validator import validate_query
 from pgqueryguard.outer_database.advice import advise_from_plan
 from pgqueryguard.outer_database.count_resourses import estimate_profile
 from pgqueryguard.outer_database.inspect import (
+    read_memory_settings,
     read_table_stats,
     run_explain,
 )
 from pgqueryguard.utils.async_run import async_command
 from pgqueryguard.query_files.files import get_sql_files, read_file
-from app.utils.llm.report import write_html_report
+from pgqueryguard.query_files.report import write_report_assets
 from pgqueryguard.query_files.report_index import IndexItem, write_index_page
+from pgqueryguard.query_files.storage import ReportStore
 from pgqueryguard.utils.annotaions import (
     DBUrlOption,
     PathArgument,
@@ -22,6 +24,7 @@ from pgqueryguard.utils.annotaions import (
 from pgqueryguard.utils.pritty_prints import (
     print_validation_errors,
 )
+from app.utils.llm.http import get_llm_http
 from app.utils.llm.query_improve import improve_and_filter_sql
 import typer
 
@@ -32,15 +35,19 @@ app = typer.Typer()
 async def report(
     directory: PathArgument,
     db_url: DBUrlOption,
+    refresh_llm: Annotated[
+        bool,
+        typer.Option("--refresh-llm", help="Ignore cached LLM answers and regenerate"),
+    ] = False,
 ):
     files = get_sql_files(directory, True)
     error_files = 0
     items_for_index = []
     output_dir = "pgqueryguard_reports"
-    reports_subdir = os.path.join(output_dir, "reports")
-    os.makedirs(reports_subdir, exist_ok=True)
+    store = ReportStore(output_dir, write_report_assets(output_dir))
 
     engine = create_engine(str(db_url))
+    mem_settings = read_memory_settings(engine)
 
     for file in files:
         base_query = await read_file(file)
@@ -50,19 +57,14 @@ async def report(
             error_files += 1
             continue
 
-        for i, query in enumerate(
-            s.strip() for s in sqlparse.split(base_query) if s.strip()
-        ):
-            basename = Path(file).name
-            out_html = os.path.join(reports_subdir, f"{basename}_{i}.html")
-            os.makedirs(os.path.dirname(out_html), exist_ok=True)
-            rel_path = os.path.relpath(out_html, output_dir).replace("\\", "/")
-
+        for query in (s.strip() for s in sqlparse.split(base_query) if s.strip()):
             plan = run_explain(engine, query)
-            profile = estimate_profile(plan)
-            adv = advise_from_plan(plan, read_table_stats(engine))
-            ai_adv = await improve_and_filter_sql(engine, query, profile=profile, n_variants=5)
-            write_html_report(out_html, plan, profile, adv, ai_adv, query)
+            profile = estimate_profile(plan, settings=mem_settings)
+            adv = advise_from_plan(plan, read_table_stats(engine), mem_settings)
+            ai_adv = await improve_and_filter_sql(
+                engine, query, profile=profile, n_variants=5, refresh_cache=refresh_llm
+            )
+            rel_path = store.put(plan, profile, adv, query, ai_advice=ai_adv)
 
             sql_text_for_excerpt = query.strip().replace("\n", " ")
             items_for_index.append(
@@ -87,6 +89,7 @@ async def report(
                 )
             )
 
+    await get_llm_http().aclose()
     write_index_page("pgqueryguard_reports", items_for_index)
     print("=== Report: ./pgqueryguard_reports/index.html ===")
 